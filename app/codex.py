@@ -1,19 +1,32 @@
 import asyncio
+import codecs
+import functools
 import json
 import logging
 import os
 import re
 import shutil
+import stat
 import tempfile
+import time
 from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+from types import MappingProxyType
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
 
 try:
     import tomllib
 except ModuleNotFoundError:  # pragma: no cover - Python < 3.11 fallback
     import tomli as tomllib  # type: ignore
 
+try:
+    import orjson
+except ModuleNotFoundError:  # pragma: no cover - optional speedup
+    orjson = None  # type: ignore
+
+# Both decoders accept bytes and raise ValueError subclasses on bad input.
+_json_loads = orjson.loads if orjson is not None else json.loads
+
 from .config import settings
 
 
@@ -23,6 +36,10 @@ class CodexError(Exception):
 
 logger = logging.getLogger(__name__)
 
+_CODEX_ENV_CACHE: Dict[str, Mapping[str, str]] = {}
+# Directories already created by this process; makedirs runs once per path.
+_ENSURED_DIRS: set[str] = set()
+
 _DEFAULT_PROFILE_DIR = (
     Path(__file__).resolve().parent.parent / "workspace" / "codex_profile"
 )
@@ -59,7 +76,20 @@ class _CodexConcurrencyLimiter:
 _parallel_limiter = _CodexConcurrencyLimiter(settings.max_parallel_requests)
 
 
-_TIMESTAMP_LINE = re.compile(r"^\[\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}]")
+if hasattr(asyncio, "timeout"):
+
+    async def _wait_with_timeout(aw: Any, timeout: float) -> Any:
+        """Await `aw` in the current task, raising TimeoutError after `timeout`."""
+
+        async with asyncio.timeout(timeout):
+            return await aw
+
+else:  # pragma: no cover - Python < 3.11
+    _wait_with_timeout = asyncio.wait_for
+
+
+_VARIANT_NONALNUM_RE = re.compile(r"[^0-9a-zA-Z._-]+")
+_VARIANT_DASHES_RE = re.compile(r"-+")
 _KNOWN_METADATA_PREFIXES = (
     "workdir:",
     "model:",
@@ -76,28 +106,94 @@ _KNOWN_METADATA_PREFIXES = (
     "retrying ",
     "error:",
 )
+_METADATA_PREFIX_RE = re.compile(
+    "|".join(re.escape(prefix) for prefix in _KNOWN_METADATA_PREFIXES)
+)
+# `process` matches the stripped line, so a line that is only "retrying" never
+# hits "retrying ". The whole-line regexes below also see trailing whitespace,
+# so there a prefix ending in a space must be followed by more text.
+_LINE_METADATA_PREFIX_PATTERNS = {
+    prefix: re.escape(prefix) + (r"(?=[^\n]*\S)" if prefix.endswith(" ") else "")
+    for prefix in _KNOWN_METADATA_PREFIXES
+}
+_USER_MARKERS = ("user instructions:", "user:")
+# Every marker test is a prefix check, so only this much of a line is lowered.
+_MARKER_HEAD_CHARS = max(len(p) for p in (*_KNOWN_METADATA_PREFIXES, "assistant:"))
+# Bytes-level prefilter for raw stdout lines: only prefixes whose lines are
+# dropped without touching filter state (i.e. not the user markers). Leading
+# ASCII punctuation/whitespace is skipped like `_LINE_HEAD_RE` does; bytes
+# >= 0x80 are never skipped since they may be alphanumeric once decoded.
+_RAW_METADATA_PREFIX_RE = re.compile(
+    rb"[^\w\x80-\xff]*(?:"
+    + b"|".join(
+        _LINE_METADATA_PREFIX_PATTERNS[prefix].encode()
+        for prefix in _KNOWN_METADATA_PREFIXES
+        if not prefix.startswith("user")
+    )
+    + rb")",
+    re.IGNORECASE,
+)
+_RAW_TIMESTAMP_LINE = re.compile(rb"\s*\[\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}]")
+# Multiline counterparts of the per-line checks, used to clean a whole
+# `--output-last-message` payload in a single pass.
+_TIMESTAMP_PATTERN = r"\[\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\]"
+_LEADING_SYMBOLS_PATTERN = r"(?:[^\w\n]|_)*"
+_METADATA_LINE_RE = re.compile(
+    rf"^(?:[^\S\n]*{_TIMESTAMP_PATTERN}|{_LEADING_SYMBOLS_PATTERN}"
+    rf"(?:{'|'.join(_LINE_METADATA_PREFIX_PATTERNS.values())})).*\n?",
+    re.MULTILINE | re.IGNORECASE,
+)
+_CONVERSATION_MARKER_RE = re.compile(
+    rf"^[^\S\n]*(?:{_TIMESTAMP_PATTERN})?{_LEADING_SYMBOLS_PATTERN}(?:user(?: instructions)?:|assistant:)",
+    re.MULTILINE | re.IGNORECASE,
+)
+# Always matches: optional timestamp, then any leading non-alphanumerics
+# (`\w` is Unicode-aware, so `[\W_]` covers exactly the non-alphanumerics).
+_LINE_HEAD_RE = re.compile(rf"(?P<ts>{_TIMESTAMP_PATTERN})?[\W_]*")
+_BLANK_LINE_RE = re.compile(r"^[^\S\n]+$", re.MULTILINE)
+_TIMESTAMP_ANYWHERE_RE = re.compile(_TIMESTAMP_PATTERN)
+_CLEAN_HEAD_CHARS = 256
 
 
 class _CodexOutputFilter:
     """Drop CLI preamble/tool logs and surface only assistant text."""
 
+    __slots__ = ("_saw_assistant", "_emitted_any", "_in_user_block")
+
     def __init__(self) -> None:
         self._saw_assistant = False
         self._emitted_any = False
         self._in_user_block = False
 
+    def drops_raw(self, raw_line: bytes) -> bool:
+        """Return True when `raw_line` would be dropped without changing state.
+
+        This is a conservative bytes-level check so callers can skip decoding
+        obvious CLI log lines; a False result means `process` must decide.
+        """
+
+        if _RAW_METADATA_PREFIX_RE.match(raw_line):
+            return True
+        if self._in_user_block:
+            return False
+        match = _RAW_TIMESTAMP_LINE.match(raw_line)
+        if match is None:
+            return False
+        rest = raw_line[match.end() :].lower()
+        return b"user" not in rest and b"assistant" not in rest
+
     def process(self, raw_line: str) -> Optional[str]:
         line = raw_line.rstrip("\r\n")
         stripped = line.strip()
-        lowered = stripped.lower()
-        match = _TIMESTAMP_LINE.match(stripped)
-        if match:
-            remainder = stripped[match.end() :].strip().lower()
-            normalized = _strip_leading_symbols(remainder)
-        else:
-            normalized = _strip_leading_symbols(lowered)
-
-        if normalized.startswith("user instructions:") or normalized.startswith("user:"):
+        # One regex pass finds the optional timestamp and the leading symbols
+        # after it; `stripped` has no trailing whitespace to trim. Only the
+        # head is lowered since the markers below are all prefix checks.
+        head = _LINE_HEAD_RE.match(stripped)
+        has_timestamp = head.group("ts") is not None
+        start = head.end()
+        normalized = stripped[start : start + _MARKER_HEAD_CHARS].lower()
+
+        if normalized.startswith(_USER_MARKERS):
             self._in_user_block = True
             return None
 
@@ -114,47 +210,73 @@ class _CodexOutputFilter:
             return None
 
         if self._in_user_block:
-            if _looks_like_codex_marker(stripped):
+            if _looks_like_codex_marker(stripped, has_timestamp=has_timestamp):
                 self._in_user_block = False
                 return None
             return None
 
-        if _is_metadata_line(stripped):
+        if has_timestamp or _METADATA_PREFIX_RE.match(normalized):
             return None
 
         if not self._saw_assistant:
             self._saw_assistant = True
 
-
         self._emitted_any = True
         return f"{line}\n"
 
 
-def _is_metadata_line(text: str) -> bool:
-    if _TIMESTAMP_LINE.match(text):
+def _looks_like_codex_marker(text: str, *, has_timestamp: bool) -> bool:
+    """Return True when a line inside a user block starts the Codex reply.
+
+    `has_timestamp` comes from the caller's head match so the timestamp is
+    not matched a second time.
+    """
+
+    if text[:9].lower() == "assistant":
         return True
-    lower = text.lower()
-    normal = _strip_leading_symbols(lower)
-    return any(normal.startswith(prefix) for prefix in _KNOWN_METADATA_PREFIXES)
+    return has_timestamp and " codex" in text.lower()
 
 
-def _strip_leading_symbols(value: str) -> str:
-    idx = 0
-    length = len(value)
-    while idx < length and not value[idx].isalnum():
-        idx += 1
-    if idx == 0:
-        return value
-    return value[idx:]
+_STREAM_READ_SIZE = 64 * 1024
+_USE_MEMFD = hasattr(os, "memfd_create") and os.path.isdir("/proc/self/fd")
+# Upper bound on text coalesced into a single run_codex yield.
+_STREAM_BATCH_CHARS = 16 * 1024
 
 
-def _looks_like_codex_marker(text: str) -> bool:
-    lowered = text.lower()
-    if lowered.startswith("assistant"):
-        return True
-    if _TIMESTAMP_LINE.match(text) and " codex" in lowered:
-        return True
-    return False
+async def _iter_stream_batches(stream: asyncio.StreamReader) -> AsyncIterator[List[bytes]]:
+    """Yield the complete lines available after each chunked read of `stream`."""
+
+    buf = bytearray()
+    while True:
+        chunk = await stream.read(_STREAM_READ_SIZE)
+        if not chunk:
+            break
+        # Only the new chunk can hold the next newline; the carried-over tail
+        # was already scanned, so long lines are not rescanned per read.
+        end = chunk.find(b"\n")
+        if end < 0:
+            buf += chunk
+            continue
+        end += len(buf)
+        buf += chunk
+        lines: List[bytes] = []
+        start = 0
+        while end >= 0:
+            lines.append(bytes(buf[start : end + 1]))
+            start = end + 1
+            end = buf.find(b"\n", start)
+        del buf[:start]
+        yield lines
+    if buf:
+        yield [bytes(buf)]
+
+
+async def _iter_stream_lines(stream: asyncio.StreamReader) -> AsyncIterator[bytes]:
+    """Yield newline-terminated lines from `stream` using large chunked reads."""
+
+    async for lines in _iter_stream_batches(stream):
+        for line in lines:
+            yield line
 
 
 def _sanitize_codex_text(raw: str) -> str:
@@ -171,10 +293,37 @@ def _sanitize_codex_text(raw: str) -> str:
     return cleaned
 
 
+def _sanitize_last_message_text(raw: str) -> str:
+    """Strip CLI metadata from an `--output-last-message` payload.
+
+    `--output-last-message` normally holds only the assistant reply, so a
+    payload whose head shows no CLI banner is returned as-is (stripped).
+    Payloads without conversation markers are cleaned with whole-text regex
+    passes; anything else goes through the stateful line filter.
+    """
+
+    head = raw[:_CLEAN_HEAD_CHARS]
+    if "workdir:" not in head and _TIMESTAMP_ANYWHERE_RE.search(head) is None:
+        return raw.strip()
+    if "\r" in raw or _CONVERSATION_MARKER_RE.search(raw):
+        return _sanitize_codex_text(raw)
+    cleaned = _METADATA_LINE_RE.sub("", raw)
+    cleaned = _BLANK_LINE_RE.sub("", cleaned)
+    return cleaned.strip("\n")
+
+
 def _resolve_codex_executable() -> str:
-    """Return the resolved Codex CLI executable path or raise CodexError."""
+    """Return the resolved Codex CLI executable path or raise CodexError.
+
+    Successful lookups are cached per (CODEX_PATH, PATH) pair so repeated
+    requests skip the filesystem probes.
+    """
 
-    codex_exe = settings.codex_path
+    return _lookup_codex_executable(settings.codex_path, os.environ.get("PATH"))
+
+
+@functools.lru_cache(maxsize=8)
+def _lookup_codex_executable(codex_exe: str, search_path: Optional[str]) -> str:
     if os.path.isabs(codex_exe):
         if not (os.path.isfile(codex_exe) and os.access(codex_exe, os.X_OK)):
             raise CodexError(
@@ -182,7 +331,7 @@ def _resolve_codex_executable() -> str:
             )
         return codex_exe
 
-    exe = shutil.which(codex_exe)
+    exe = shutil.which(codex_exe, path=search_path)
     if not exe:
         raise CodexError(
             f"codex binary not found in PATH (CODEX_PATH='{codex_exe}'). Install Codex or set CODEX_PATH."
@@ -190,15 +339,32 @@ def _resolve_codex_executable() -> str:
     return exe
 
 
+_resolve_codex_executable.cache_clear = _lookup_codex_executable.cache_clear  # type: ignore[attr-defined]
+
+
+def refresh_codex_executable() -> str:
+    """Drop the cached executable lookup and resolve Codex again.
+
+    Use after upgrading or moving the Codex binary while the server is running.
+    """
+
+    _lookup_codex_executable.cache_clear()
+    return _resolve_codex_executable()
+
+
 def _ensure_workdir_exists() -> None:
     """Ensure Codex working directory exists."""
 
+    workdir = settings.codex_workdir
+    if workdir in _ENSURED_DIRS:
+        return
     try:
-        os.makedirs(settings.codex_workdir, exist_ok=True)
+        os.makedirs(workdir, exist_ok=True)
     except Exception as e:
         raise CodexError(
-            f"Failed to create CODEX_WORKDIR '{settings.codex_workdir}': {e}"
+            f"Failed to create CODEX_WORKDIR '{workdir}': {e}"
         )
+    _ENSURED_DIRS.add(workdir)
 
 
 def _resolve_codex_home_dir() -> Path:
@@ -229,7 +395,11 @@ def apply_codex_profile_overrides() -> None:
         if configured_dir
         else _DEFAULT_PROFILE_DIR
     )
-    if not source_dir.is_dir():
+    # One directory listing replaces a stat() per candidate filename.
+    try:
+        with os.scandir(source_dir) as entries:
+            available = {entry.name for entry in entries if entry.is_file()}
+    except (FileNotFoundError, NotADirectoryError):
         return
 
     pending: list[tuple[Path, str, Optional[str], str]] = []
@@ -237,9 +407,8 @@ def apply_codex_profile_overrides() -> None:
         selected_path: Optional[Path] = None
         legacy_match: Optional[str] = None
         for candidate in (primary_name, *legacy_names):
-            candidate_path = source_dir / candidate
-            if candidate_path.is_file():
-                selected_path = candidate_path
+            if candidate in available:
+                selected_path = source_dir / candidate
                 if candidate != primary_name:
                     legacy_match = candidate
                 break
@@ -252,35 +421,87 @@ def apply_codex_profile_overrides() -> None:
     codex_home = _resolve_codex_home_dir()
     for src_path, dest_name, legacy_name, primary_name in pending:
         dest_path = codex_home / dest_name
-        try:
-            shutil.copyfile(src_path, dest_path)
-        except Exception as exc:
-            raise CodexError(
-                f"Failed to copy '{src_path}' to '{dest_path}': {exc}"
-            ) from exc
         if legacy_name:
             logger.warning(
                 "Codex profile override using legacy filename '%s'; rename to '%s' for future compatibility.",
                 legacy_name,
                 primary_name,
             )
+        try:
+            src_stat = src_path.stat()
+            if _is_profile_copy_current(src_stat, dest_path):
+                logger.debug("Codex profile override already up to date: %s", dest_path)
+                continue
+            shutil.copyfile(src_path, dest_path)
+            # Stamp the copy with the source mtime so the next start can skip it.
+            os.utime(dest_path, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+        except Exception as exc:
+            raise CodexError(
+                f"Failed to copy '{src_path}' to '{dest_path}': {exc}"
+            ) from exc
         logger.info("Applied Codex profile override: %s -> %s", src_path, dest_path)
 
 
-def _build_codex_env() -> Dict[str, str]:
-    """Prepare environment variables for Codex subprocesses."""
+def _is_profile_copy_current(src_stat: os.stat_result, dest_path: Path) -> bool:
+    """Return True when `dest_path` is an untouched copy made by a previous run."""
+
+    try:
+        dest_stat = dest_path.stat()
+    except FileNotFoundError:
+        return False
+    return (
+        dest_stat.st_size == src_stat.st_size
+        and dest_stat.st_mtime_ns == src_stat.st_mtime_ns
+    )
+
+
+def _build_codex_env() -> Optional[Mapping[str, str]]:
+    """Prepare environment variables for Codex subprocesses.
+
+    Returns None when no CODEX_CONFIG_DIR is configured so the child simply
+    inherits this process's environment. Otherwise the environment plus
+    CODEX_HOME is snapshotted once per directory and shared between requests
+    as a read-only mapping.
+    """
 
-    env = os.environ.copy()
     config_dir = settings.codex_config_dir
-    if config_dir:
+    if not config_dir:
+        return None
+    cached = _CODEX_ENV_CACHE.get(config_dir)
+    if cached is not None:
+        return cached
+
+    if config_dir not in _ENSURED_DIRS:
         try:
             os.makedirs(config_dir, exist_ok=True)
         except Exception as exc:
             raise CodexError(
                 f"Failed to prepare CODEX_CONFIG_DIR '{config_dir}': {exc}"
             )
-        env["CODEX_HOME"] = config_dir
-    return env
+        _ENSURED_DIRS.add(config_dir)
+    frozen = MappingProxyType({**os.environ, "CODEX_HOME": config_dir})
+    _CODEX_ENV_CACHE[config_dir] = frozen
+    return frozen
+
+
+def _clear_codex_caches() -> None:
+    """Forget cached executable lookups, subprocess environments and ensured dirs."""
+
+    _resolve_codex_executable.cache_clear()  # type: ignore[attr-defined]
+    _CODEX_ENV_CACHE.clear()
+    _ENSURED_DIRS.clear()
+
+
+_CONFIG_FLAG = "--config"
+_IMAGE_FLAG = "--image"
+_TOML_BOOLS = {True: "true", False: "false"}
+# x_codex override name -> (Codex config key, optional value conversion).
+_OVERRIDE_MAP: Dict[str, Tuple[str, Optional[Any]]] = {
+    "sandbox": ("sandbox_mode", None),
+    "reasoning_effort": ("model_reasoning_effort", None),
+    "hide_reasoning": ("hide_agent_reasoning", bool),
+    "expose_reasoning": ("hide_agent_reasoning", lambda v: not v),
+}
 
 
 def _build_cmd_and_env(
@@ -290,76 +511,230 @@ def _build_cmd_and_env(
     model: Optional[str] = None,
 ) -> list[str]:
     """Build base `codex exec` command with configs and optional images."""
-    cfg = {
-        "sandbox_mode": settings.sandbox_mode,
-        "model_reasoning_effort": settings.reasoning_effort,
-        "hide_agent_reasoning": settings.hide_reasoning,
-    }
-    # Map API overrides (x_codex) to Codex config keys
-    if overrides:
-        mapped: Dict[str, object] = {}
-        for k, v in overrides.items():
-            if v is None:
-                continue
-            if k == "sandbox":
-                mapped["sandbox_mode"] = v
-            elif k == "reasoning_effort":
-                mapped["model_reasoning_effort"] = v
-            elif k == "hide_reasoning":
-                mapped["hide_agent_reasoning"] = bool(v)
-            elif k == "expose_reasoning":
-                mapped["hide_agent_reasoning"] = not bool(v)
-            else:
-                mapped[k] = v
-        cfg.update(mapped)
-
     # Resolve codex executable
     exe = _resolve_codex_executable()
 
     # Ensure workdir exists (create if missing)
     _ensure_workdir_exists()
 
+    if overrides:
+        config_args, network_args = _override_cmd_args(overrides)
+    else:
+        # Common case: the flags only depend on settings, so reuse them.
+        config_args, network_args = _default_cmd_args(
+            settings.sandbox_mode,
+            settings.reasoning_effort,
+            settings.hide_reasoning,
+            settings.workspace_network_access,
+        )
+
     # Note: Rust CLI does not support `-q`. Use human output or JSON mode selectively.
     cmd = [exe, "exec", prompt, "--color", "never"]
     if images:
-        for img in images:
-            cmd += ["--image", img]
+        cmd.extend(_iter_image_flags(images))
+    cmd.extend(config_args)
+
+    if model:
+        cmd.extend((_CONFIG_FLAG, f"model=\"{model}\""))
+
+    cmd.extend(network_args)
+    return cmd
+
+
+@functools.lru_cache(maxsize=16)
+def _default_cmd_args(
+    sandbox_mode: str,
+    reasoning_effort: str,
+    hide_reasoning: bool,
+    workspace_network_access: bool,
+) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Return `(config_args, network_args)` for a request without overrides."""
+    cfg = {
+        "sandbox_mode": sandbox_mode,
+        "model_reasoning_effort": reasoning_effort,
+        "hide_agent_reasoning": hide_reasoning,
+    }
+    network_args = _network_flags(sandbox_mode, None, workspace_network_access)
+    return tuple(_iter_config_flags(cfg)), network_args
+
+
+def _override_cmd_args(overrides: Dict) -> Tuple[List[str], Tuple[str, ...]]:
+    """Return `(config_args, network_args)` with API overrides applied."""
+    cfg: Dict[str, object] = {
+        "sandbox_mode": settings.sandbox_mode,
+        "model_reasoning_effort": settings.reasoning_effort,
+        "hide_agent_reasoning": settings.hide_reasoning,
+    }
+    # Map API overrides (x_codex) to Codex config keys
+    for k, v in overrides.items():
+        if v is None:
+            continue
+        target = _OVERRIDE_MAP.get(k)
+        if target is None:
+            cfg[k] = v
+        else:
+            key, convert = target
+            cfg[key] = convert(v) if convert is not None else v
+
+    network_args = _network_flags(
+        cfg.get("sandbox_mode", settings.sandbox_mode),
+        overrides.get("network_access"),
+        settings.workspace_network_access,
+    )
+    return list(_iter_config_flags(cfg)), network_args
+
+
+def _network_flags(
+    effective_sandbox: object,
+    override_network: object,
+    workspace_network_access: bool,
+) -> Tuple[str, ...]:
+    if effective_sandbox != "workspace-write":
+        return ()
+    if override_network is not None:
+        allow_network = bool(override_network)
+    elif workspace_network_access:
+        allow_network = True
+    else:
+        return ()
+    toml_bool = _TOML_BOOLS[allow_network]
+    return (_CONFIG_FLAG, f"sandbox_workspace_write={{ network_access = {toml_bool} }}")
+
+
+def _iter_image_flags(images: Iterable[str]) -> Iterator[str]:
+    for img in images:
+        yield _IMAGE_FLAG
+        yield img
+
+
+def _iter_config_flags(cfg: Dict[str, object]) -> Iterator[str]:
     for key, value in cfg.items():
         if key == "network_access":
             # handled separately when sandbox_mode is workspace-write
             continue
+        yield _CONFIG_FLAG
         # Use TOML-style quoting for strings
         if isinstance(value, str):
-            cmd += ["--config", f"{key}=\"{value}\""]
+            yield f"{key}=\"{value}\""
         elif isinstance(value, bool):
-            bool_value = "true" if value else "false"
-            cmd += ["--config", f"{key}={bool_value}"]
+            yield f"{key}={_TOML_BOOLS[value]}"
         else:
-            cmd += ["--config", f"{key}={value}"]
+            yield f"{key}={value}"
 
-    if model:
-        cmd += ["--config", f"model=\"{model}\""]
 
-    override_network = overrides.get("network_access") if overrides else None
+_MODELS_CACHE_TTL = 60.0
 
-    effective_sandbox = cfg.get("sandbox_mode", settings.sandbox_mode)
-    if effective_sandbox == "workspace-write":
-        allow_network = (
-            bool(override_network)
-            if override_network is not None
-            else settings.workspace_network_access
-        )
-        if override_network is not None or settings.workspace_network_access:
-            toml_bool = "true" if allow_network else "false"
-            cmd += ["--config", f"sandbox_workspace_write={{ network_access = {toml_bool} }}"]
 
-    return cmd
+def _available_cpu_count() -> int:
+    """Return the number of CPUs this process may run on (at least 1)."""
+
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except (AttributeError, OSError):  # pragma: no cover - non-Linux platforms
+        return max(1, os.cpu_count() or 1)
+
+
+# Upper bound on concurrently spawned `codex models` probes.
+_MODELS_PROBE_CONCURRENCY = _available_cpu_count()
+_MODELS_CACHE: Dict[Tuple[str, str, Optional[str]], Tuple[float, List[str]]] = {}
+# In-flight discoveries so concurrent cache misses share one probe.
+_MODELS_INFLIGHT: Dict[Tuple[str, str, Optional[str]], "asyncio.Future[List[str]]"] = {}
 
 
 async def list_codex_models() -> List[str]:
-    """Query the Codex CLI for available models."""
+    """Query the Codex CLI for available models.
+
+    Successful listings are cached for `_MODELS_CACHE_TTL` seconds per
+    executable/workdir/config-dir combination and concurrent callers share a
+    single in-flight probe; call `list_codex_models.cache_clear()` to force a
+    fresh probe.
+    """
 
     exe = _resolve_codex_executable()
+    cache_key = (exe, settings.codex_workdir, settings.codex_config_dir)
+    cached = _MODELS_CACHE.get(cache_key)
+    if cached is not None and time.monotonic() - cached[0] < _MODELS_CACHE_TTL:
+        return list(cached[1])
+
+    inflight = _MODELS_INFLIGHT.get(cache_key)
+    if inflight is None:
+        inflight = asyncio.ensure_future(_refresh_models_cache(exe, cache_key))
+        _MODELS_INFLIGHT[cache_key] = inflight
+        inflight.add_done_callback(lambda _: _MODELS_INFLIGHT.pop(cache_key, None))
+    # Shielded so one cancelled caller does not abort the probe for the rest.
+    return list(await asyncio.shield(inflight))
+
+
+async def _refresh_models_cache(
+    exe: str, cache_key: Tuple[str, str, Optional[str]]
+) -> List[str]:
+    models = await _discover_codex_models(exe)
+    _MODELS_CACHE[cache_key] = (time.monotonic(), models)
+    return models
+
+
+list_codex_models.cache_clear = _MODELS_CACHE.clear  # type: ignore[attr-defined]
+
+
+async def _run_models_listing(
+    cmd: List[str], codex_env: Optional[Mapping[str, str]]
+) -> Tuple[List[str], Optional[str]]:
+    """Run one `codex models` variant and return `(models, error)`."""
+
+    # The spawn itself is shielded: a probe cancelled mid-spawn (a
+    # higher-priority attempt won) would otherwise leave a child behind that
+    # nobody kills or reaps. Let the spawn finish, then tear the child down.
+    spawn = asyncio.ensure_future(
+        asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=settings.codex_workdir,
+            env=codex_env,
+        )
+    )
+    try:
+        proc = await asyncio.shield(spawn)
+    except asyncio.CancelledError:
+        await asyncio.wait((spawn,))
+        if not spawn.cancelled() and spawn.exception() is None:
+            orphan = spawn.result()
+            orphan.kill()
+            await orphan.wait()
+        raise
+    except FileNotFoundError as e:
+        raise CodexError(
+            f"Failed to launch codex: {e}. Check CODEX_PATH and PATH."
+        )
+    except PermissionError as e:
+        raise CodexError(
+            f"Permission error launching codex: {e}. Ensure the binary is executable."
+        )
+    except Exception as e:  # pragma: no cover - unexpected failure
+        return [], f"{' '.join(cmd)} -> {e}"
+
+    try:
+        stdout_data, stderr_data = await _wait_with_timeout(
+            proc.communicate(), settings.timeout_seconds
+        )
+    except asyncio.TimeoutError:
+        return [], f"{' '.join(cmd)} -> timed out"
+    finally:
+        # Also reached when a higher-priority attempt won and this one was cancelled.
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+
+    if proc.returncode != 0:
+        err_text = _stderr_text(stderr_data, f"exit code {proc.returncode}")
+        return [], f"{' '.join(cmd)} -> {err_text}"
+
+    return _parse_model_listing(stdout_data.decode(errors="ignore") if stdout_data else ""), None
+
+
+async def _discover_codex_models(exe: str) -> List[str]:
+    """Try each Codex listing strategy by priority and return the first hit."""
+
     _ensure_workdir_exists()
     codex_env = _build_codex_env()
 
@@ -371,48 +746,27 @@ async def list_codex_models() -> List[str]:
     ]
     errors: List[str] = []
 
-    for cmd in attempts:
-        try:
-            proc = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                cwd=settings.codex_workdir,
-                env=codex_env,
-            )
-        except FileNotFoundError as e:
-            raise CodexError(
-                f"Failed to launch codex: {e}. Check CODEX_PATH and PATH."
-            )
-        except PermissionError as e:
-            raise CodexError(
-                f"Permission error launching codex: {e}. Ensure the binary is executable."
-            )
-        except Exception as e:  # pragma: no cover - unexpected failure
-            errors.append(f"{' '.join(cmd)} -> {e}")
-            continue
-
-        try:
-            stdout_data, stderr_data = await asyncio.wait_for(
-                proc.communicate(), timeout=settings.timeout_seconds
-            )
-        except asyncio.TimeoutError:
-            proc.kill()
-            await proc.wait()
-            errors.append(f"{' '.join(cmd)} -> timed out")
-            continue
+    # Launch the listing variants concurrently (bounded by the CPUs we may
+    # use) but honour their priority order: the first successful attempt
+    # wins once all higher-priority ones failed.
+    probe_slots = asyncio.Semaphore(min(len(attempts), _MODELS_PROBE_CONCURRENCY))
 
-        if proc.returncode != 0:
-            err_text = (stderr_data or b"").decode().strip() or f"exit code {proc.returncode}"
-            errors.append(f"{' '.join(cmd)} -> {err_text}")
-            continue
-
-        models = _parse_model_listing((stdout_data or b"").decode())
-        if models:
-            logger.debug("Resolved Codex models via '%s': %s", " ".join(cmd), models)
-            return models
+    async def _attempt(cmd: List[str]) -> Tuple[List[str], Optional[str]]:
+        async with probe_slots:
+            return await _run_models_listing(cmd, codex_env)
 
-        errors.append(f"{' '.join(cmd)} -> no models returned")
+    tasks = [asyncio.create_task(_attempt(cmd)) for cmd in attempts]
+    try:
+        for cmd, task in zip(attempts, tasks):
+            models, error = await task
+            if models:
+                logger.debug("Resolved Codex models via '%s': %s", " ".join(cmd), models)
+                return models
+            errors.append(error or f"{' '.join(cmd)} -> no models returned")
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
 
     try:
         proto_models = await _probe_models_via_proto(exe)
@@ -439,17 +793,28 @@ async def list_codex_models() -> List[str]:
     raise CodexError(f"Unable to list Codex models ({detail})")
 
 
+# One plaintext listing row: first column and the remaining columns, skipping
+# blank lines and the "Available models" banner.
+_PLAINTEXT_MODEL_LINE_RE = re.compile(
+    r"^[^\S\n]*(?!available models)(\S+)([^\n]*)", re.MULTILINE | re.IGNORECASE
+)
+_PLAINTEXT_HEADER_TOKENS = frozenset({"model", "name", "id"})
+
+
 def _parse_model_listing(raw: str) -> List[str]:
     """Parse Codex CLI model listings from JSON or plaintext."""
 
     if not raw:
         return []
 
+    # Plaintext listings are the common fallback; skip the JSON attempt (and
+    # its exception) unless the payload can be a JSON object or array.
+    head = raw.lstrip()[:1]
     try:
-        data = json.loads(raw)
-    except json.JSONDecodeError:
-        pass
-    else:
+        data = _json_loads(raw) if head in ("{", "[") else None
+    except ValueError:
+        data = None
+    if data is not None:
         items = None
         if isinstance(data, dict):
             for key in ("data", "models", "items"):
@@ -470,26 +835,14 @@ def _parse_model_listing(raw: str) -> List[str]:
             return _dedupe_preserving_order(parsed)
 
     parsed_lines: List[str] = []
-    for line in raw.splitlines():
-        stripped = line.strip()
-        if not stripped:
-            continue
-        lower = stripped.lower()
-        if lower.startswith("available models"):
-            continue
-        parts = stripped.split()
-        if not parts:
-            continue
-        token = parts[0]
-        lowered_token = token.lower()
-        if lowered_token in {"model", "name", "id"}:
+    for token, rest in _PLAINTEXT_MODEL_LINE_RE.findall(raw):
+        if token.lower() in _PLAINTEXT_HEADER_TOKENS:
             continue
         parsed_lines.append(token)
-        if len(parts) > 1:
-            for variant in parts[1:]:
-                alias = _compose_codex_variant_name(token, variant)
-                if alias:
-                    parsed_lines.append(alias)
+        for variant in rest.split():
+            alias = _compose_codex_variant_name(token, variant)
+            if alias:
+                parsed_lines.append(alias)
 
     return _dedupe_preserving_order(parsed_lines)
 
@@ -550,11 +903,14 @@ def _iter_variant_strings(value: Any) -> Iterable[str]:
                 yield maybe
 
 
+# Listings repeat the same (base, variant) pairs across probes; dict inputs to
+# the callers are unhashable, so memoization happens at this leaf.
+@functools.lru_cache(maxsize=1024)
 def _compose_codex_variant_name(base: Optional[str], variant: str) -> Optional[str]:
     if not variant:
         return None
-    normalized_variant = re.sub(r"[^0-9a-zA-Z._-]+", "-", variant.strip().lower())
-    normalized_variant = re.sub(r"-+", "-", normalized_variant).strip("-")
+    normalized_variant = _VARIANT_NONALNUM_RE.sub("-", variant.strip().lower())
+    normalized_variant = _VARIANT_DASHES_RE.sub("-", normalized_variant).strip("-")
     if not normalized_variant or "codex" not in normalized_variant:
         return None
 
@@ -566,6 +922,10 @@ def _compose_codex_variant_name(base: Optional[str], variant: str) -> Optional[s
     return normalized_variant
 
 
+# How long `codex proto` gets to exit after SIGTERM before it is killed.
+_PROTO_TERMINATE_GRACE = 0.2
+
+
 async def _probe_models_via_proto(exe: str) -> List[str]:
     """Use `codex proto` to discover the current default model."""
 
@@ -584,46 +944,53 @@ async def _probe_models_via_proto(exe: str) -> List[str]:
     except FileNotFoundError as exc:
         raise CodexError(f"Failed to launch codex proto: {exc}")
 
-    discovered: Optional[str] = None
     try:
         assert proc.stdout is not None
-        while True:
-            try:
-                line = await asyncio.wait_for(proc.stdout.readline(), timeout=settings.timeout_seconds)
-            except asyncio.TimeoutError as exc:
-                raise CodexError("codex proto did not emit session_configured in time") from exc
-            if not line:
-                break
-            try:
-                payload = json.loads(line.decode())
-            except json.JSONDecodeError:
-                continue
-            msg = payload.get("msg") if isinstance(payload, dict) else None
-            if isinstance(msg, dict) and msg.get("type") == "session_configured":
-                model = msg.get("model")
-                if isinstance(model, str) and model:
-                    discovered = model
-                break
+        # A single deadline covers the whole handshake rather than each line.
+        discovered = await _wait_with_timeout(
+            _read_session_model(proc.stdout), settings.timeout_seconds
+        )
+    except asyncio.TimeoutError as exc:
+        raise CodexError("codex proto did not emit session_configured in time") from exc
     finally:
-        shutdown_payload = json.dumps({"id": "wrapper_shutdown", "op": {"type": "shutdown"}}) + "\n"
+        # The probe only needs the handshake; tear the session down right away
+        # instead of negotiating a protocol-level shutdown.
         if proc.stdin is not None:
+            proc.stdin.close()
+        if proc.returncode is None:
             try:
-                proc.stdin.write(shutdown_payload.encode())
-                await proc.stdin.drain()
-            except Exception:
+                proc.terminate()
+            except ProcessLookupError:
                 pass
-            proc.stdin.close()
-        try:
-            await asyncio.wait_for(proc.wait(), timeout=5)
-        except asyncio.TimeoutError:
-            proc.kill()
-            await proc.wait()
+            try:
+                await _wait_with_timeout(proc.wait(), _PROTO_TERMINATE_GRACE)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
 
     if discovered:
         return [discovered]
     return []
 
 
+async def _read_session_model(stream: asyncio.StreamReader) -> Optional[str]:
+    """Return the model announced by `session_configured`, if any."""
+
+    async for line in _iter_stream_lines(stream):
+        # Only protocol events carry a "msg" key; skip anything else undecoded.
+        if b'"msg"' not in line:
+            continue
+        try:
+            payload = _json_loads(line)
+        except ValueError:
+            continue
+        msg = payload.get("msg") if isinstance(payload, dict) else None
+        if isinstance(msg, dict) and msg.get("type") == "session_configured":
+            model = msg.get("model")
+            return model if isinstance(model, str) and model else None
+    return None
+
+
 def _dedupe_preserving_order(values: List[str]) -> List[str]:
     seen = set()
     result: List[str] = []
@@ -635,8 +1002,15 @@ def _dedupe_preserving_order(values: List[str]) -> List[str]:
     return result
 
 
+# config.toml path -> ((st_mtime_ns, st_size), models) from the last parse.
+_CONFIG_MODELS_CACHE: Dict[str, Tuple[Tuple[int, int], List[str]]] = {}
+
+
 def _models_from_config() -> List[str]:
-    """Extract model names from ~/.codex/config.toml as a fallback."""
+    """Extract model names from ~/.codex/config.toml as a fallback.
+
+    The parsed result is reused until the file's mtime or size changes.
+    """
 
     codex_home = (
         settings.codex_config_dir
@@ -644,32 +1018,51 @@ def _models_from_config() -> List[str]:
         or os.path.expanduser("~/.codex")
     )
     config_path = os.path.join(codex_home, "config.toml")
-    if not os.path.isfile(config_path):
+    try:
+        st = os.stat(config_path)
+    except OSError:
+        return []
+    if not stat.S_ISREG(st.st_mode):
         return []
 
-    with open(config_path, "rb") as fh:
-        data = tomllib.load(fh)
+    signature = (st.st_mtime_ns, st.st_size)
+    cached = _CONFIG_MODELS_CACHE.get(config_path)
+    if cached is not None and cached[0] == signature:
+        return list(cached[1])
 
-    models: List[str] = []
+    models = _parse_config_models(config_path)
+    _CONFIG_MODELS_CACHE[config_path] = (signature, models)
+    return list(models)
 
-    def _add(value: Optional[str]) -> None:
-        if isinstance(value, str) and value:
-            models.append(value)
 
-    _add(data.get("model"))
+def _parse_config_models(config_path: str) -> List[str]:
+    with open(config_path, "rb") as fh:
+        data = tomllib.load(fh)
+
+    candidates = [data.get("model")]
     profiles = data.get("profiles")
     if isinstance(profiles, dict):
         for profile in profiles.values():
             if isinstance(profile, dict):
-                _add(profile.get("model"))
+                candidates.append(profile.get("model"))
 
-    augmented = list(models)
-    for model in list(models):
-        if isinstance(model, str) and model.endswith('-codex'):
-            base = model[:-6]
-            if base:
-                augmented.append(base)
-    return _dedupe_preserving_order(augmented)
+    # Configured names keep their order; each "-codex" base follows all of
+    # them, as in the plain name-then-base expansion, deduplicated in one pass.
+    models: List[str] = []
+    bases: List[str] = []
+    seen: set[str] = set()
+    for value in candidates:
+        if not isinstance(value, str) or not value or value in seen:
+            continue
+        seen.add(value)
+        models.append(value)
+        if value.endswith("-codex"):
+            bases.append(value[:-6])
+    for base in bases:
+        if base and base not in seen:
+            seen.add(base)
+            models.append(base)
+    return models
 
 
 async def run_codex(
@@ -682,6 +1075,9 @@ async def run_codex(
     cmd = _build_cmd_and_env(prompt, overrides, images, model)
     codex_env = _build_codex_env()
     output_filter = _CodexOutputFilter()
+    # One decoder per stream; lines always end on "\n" so no partial
+    # sequences are carried between calls.
+    decode = codecs.getincrementaldecoder("utf-8")(errors="ignore").decode
 
     async with _parallel_limiter.slot():
         try:
@@ -704,17 +1100,29 @@ async def run_codex(
             raise CodexError(f"Unable to start codex process: {e}")
 
         try:
-            while True:
-                line = await proc.stdout.readline()
-                if not line:
-                    break
-                filtered = output_filter.process(line.decode(errors="ignore"))
-                if filtered:
-                    yield filtered
-            await asyncio.wait_for(proc.wait(), timeout=settings.timeout_seconds)
+            # Coalesce the text surviving one read into a single yield so the
+            # SSE layer frames bursts instead of individual lines.
+            async for lines in _iter_stream_batches(proc.stdout):
+                pending: List[str] = []
+                pending_chars = 0
+                for line in lines:
+                    if output_filter.drops_raw(line):
+                        continue
+                    filtered = output_filter.process(decode(line))
+                    if not filtered:
+                        continue
+                    pending.append(filtered)
+                    pending_chars += len(filtered)
+                    if pending_chars >= _STREAM_BATCH_CHARS:
+                        yield "".join(pending)
+                        pending = []
+                        pending_chars = 0
+                if pending:
+                    yield "".join(pending)
+            await _wait_with_timeout(proc.wait(), settings.timeout_seconds)
             if proc.returncode != 0:
-                err = (await proc.stderr.read()).decode().strip()
-                raise CodexError(err or "codex execution failed")
+                err = _stderr_text(await proc.stderr.read(), "codex execution failed")
+                raise CodexError(err)
         except asyncio.TimeoutError:
             proc.kill()
             raise CodexError("codex execution timed out")
@@ -736,44 +1144,102 @@ async def run_codex_last_message(
     This avoids human oriented headers and logs from the CLI.
     """
     cmd = _build_cmd_and_env(prompt, overrides, images, model)
-    # Create temp file in workdir to ensure permissions
-    _ensure_workdir_exists()
     codex_env = _build_codex_env()
-    with tempfile.NamedTemporaryFile(prefix="codex-last-", suffix=".txt", dir=settings.codex_workdir, delete=False) as tf:
-        out_path = tf.name
+    memfd, out_path = _create_last_message_sink()
     cmd = cmd + ["--json", "--output-last-message", out_path]
+    spawn_kwargs: Dict[str, Any] = {}
+    if memfd is not None:
+        spawn_kwargs["pass_fds"] = (memfd,)
     try:
         async with _parallel_limiter.slot():
+            # Only the last-message file is used, so the --json event stream on
+            # stdout is discarded rather than buffered in memory.
             proc = await asyncio.create_subprocess_exec(
                 *cmd,
-                stdout=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.DEVNULL,
                 stderr=asyncio.subprocess.PIPE,
                 cwd=settings.codex_workdir,
                 env=codex_env,
+                **spawn_kwargs,
             )
-            stdout_data, stderr_data = await asyncio.wait_for(
-                proc.communicate(), timeout=settings.timeout_seconds
-            )
+            try:
+                _, stderr_data = await _wait_with_timeout(
+                    proc.communicate(), settings.timeout_seconds
+                )
+            finally:
+                # Do not leave codex running after a timeout or cancellation.
+                if proc.returncode is None:
+                    proc.kill()
+                    await proc.wait()
             if proc.returncode != 0:
-                err = (stderr_data or b"").decode().strip() or "codex execution failed"
+                err = _stderr_text(stderr_data, "codex execution failed")
                 raise CodexError(err)
             try:
-                with open(out_path, "r", encoding="utf-8", errors="ignore") as f:
-                    text = f.read()
+                if memfd is not None:
+                    text = _read_fd_text(memfd)
+                else:
+                    with open(out_path, "r", encoding="utf-8", errors="ignore") as f:
+                        text = f.read()
             except Exception:
                 text = ""
 
-            if not text:
-                # Fallback to any stdout text when the file is empty or missing.
-                text = (stdout_data or b"").decode(errors="ignore")
-            sanitized = _sanitize_codex_text(text)
+            sanitized = _sanitize_last_message_text(text)
             if sanitized:
                 return sanitized
-            return text.strip()
+            text = text.strip()
+            if not text:
+                # stdout is discarded, so there is no other reply to fall back
+                # to; fail loudly instead of answering with an empty message.
+                raise CodexError("codex exited without writing a final message")
+            return text
     except asyncio.TimeoutError:
         raise CodexError("codex execution timed out")
     finally:
         try:
-            os.remove(out_path)
+            if memfd is not None:
+                os.close(memfd)
+            else:
+                os.remove(out_path)
         except Exception:
             pass
+
+
+def _stderr_text(data: Optional[bytes], default: str) -> str:
+    """Decode captured stderr for an error message, or return `default`."""
+
+    text = data.decode(errors="ignore").strip() if data else ""
+    return text or default
+
+
+def _create_last_message_sink() -> Tuple[Optional[int], str]:
+    """Return `(memfd, path)` to pass as `--output-last-message`.
+
+    On Linux the CLI writes into an anonymous in-memory file inherited by the
+    child and addressed via `/proc/self/fd`; elsewhere (or when memfd_create
+    is unavailable) a temp file in CODEX_WORKDIR is used and `memfd` is None.
+    """
+
+    if _USE_MEMFD:
+        try:
+            fd = os.memfd_create("codex-last-message", os.MFD_CLOEXEC)
+        except OSError as exc:
+            logger.debug("memfd_create unavailable, using a temp file: %s", exc)
+        else:
+            return fd, f"/proc/self/fd/{fd}"
+
+    # Create temp file in workdir to ensure permissions
+    _ensure_workdir_exists()
+    fd, path = tempfile.mkstemp(prefix="codex-last-", suffix=".txt", dir=settings.codex_workdir)
+    os.close(fd)
+    return None, path
+
+
+def _read_fd_text(fd: int) -> str:
+    os.lseek(fd, 0, os.SEEK_SET)
+    chunks: List[bytes] = []
+    while True:
+        chunk = os.read(fd, _STREAM_READ_SIZE)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return b"".join(chunks).decode("utf-8", errors="ignore")
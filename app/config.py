@@ -1,3 +1,4 @@
+import functools
 import os
 from typing import Optional
 
@@ -26,6 +27,9 @@ class Settings(BaseSettings):
         default=2, alias="CODEX_MAX_PARALLEL_REQUESTS"
     )
     rate_limit_per_minute: int = Field(default=60, alias="RATE_LIMIT_PER_MINUTE")
+    # Comma-separated browser origins allowed via CORS; "*" allows any origin
+    # and an empty value disables the CORS middleware entirely.
+    cors_origins: str = Field(default="*", alias="CORS_ORIGINS")
     hide_reasoning: bool = Field(default=False, alias="CODEX_HIDE_REASONING")
     # Allow server to honor x_codex.sandbox == "danger-full-access" requests.
     # When false, such requests are blocked if received (unless CODEX_LOCAL_ONLY is also false
@@ -35,13 +39,20 @@ class Settings(BaseSettings):
     codex_model: Optional[str] = Field(default=None, alias="CODEX_MODEL")
 
     # Default to loading from ".env". You can override the path by
-    # passing `_env_file` when instantiating `Settings` (see bottom).
+    # passing `_env_file` when instantiating `Settings` (see `get_settings`).
     model_config = SettingsConfigDict(case_sensitive=False, env_file=".env")
 
-# Allow overriding env file path via process env `CODEX_ENV_FILE`.
-# Note: this variable must be set in the OS/process environment (not inside .env),
-# because it controls which .env file to read.
-_ENV_FILE = os.getenv("CODEX_ENV_FILE") or ".env"
+@functools.lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Return the process-wide settings, reading the env file only once.
 
-# Instantiate settings, optionally pointing to a custom env file.
-settings = Settings(_env_file=_ENV_FILE)
+    The env file path can be overridden via the process env `CODEX_ENV_FILE`.
+    Note: this variable must be set in the OS/process environment (not inside
+    .env), because it controls which .env file to read.
+    """
+    return Settings(_env_file=os.getenv("CODEX_ENV_FILE") or ".env")
+
+
+# Module-level alias used throughout the app; the same instance that
+# `get_settings()` returns (e.g. for use as a FastAPI dependency).
+settings = get_settings()
@@ -6,6 +6,7 @@ from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
 from .config import settings
+from .security import assert_local_only_or_raise
 
 
 security = HTTPBearer(auto_error=False)
@@ -20,6 +21,15 @@ async def verify_api_key(credentials: Optional[HTTPAuthorizationCredentials] = D
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized")
 
 
+async def require_local_only() -> None:
+    """Reject requests when LOCAL_ONLY is set and the provider is not local."""
+    if settings.local_only:
+        try:
+            assert_local_only_or_raise()
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
 async def rate_limiter(request: Request) -> None:
     """Simple in-memory rate limiter per IP address."""
     if settings.rate_limit_per_minute <= 0:
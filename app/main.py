@@ -1,60 +1,368 @@
+import asyncio
+import io
 import json
 import os
+import secrets
 import time
-import uuid
-from typing import AsyncIterator, List
+from contextlib import aclosing, asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-from fastapi import Depends, FastAPI, HTTPException
+try:
+    import orjson
+except ModuleNotFoundError:  # pragma: no cover - optional speedup
+    orjson = None  # type: ignore
+
+import anyio
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
 
-from .codex import CodexError, run_codex, run_codex_last_message
+from .codex import (
+    CodexError,
+    apply_codex_profile_overrides,
+    run_codex,
+    run_codex_last_message,
+)
 from .config import settings
-from .deps import rate_limiter, verify_api_key
+from .deps import rate_limiter, require_local_only, verify_api_key
 from .model_registry import (
     choose_model,
-    get_available_models,
-    initialize_model_registry,
+    get_models_body,
+    start_model_registry_refresh,
+    wait_for_model_registry,
 )
-from .security import assert_local_only_or_raise
 from .prompt import build_prompt_and_images, normalize_responses_input
 from .images import save_image_to_temp
-from .schemas import (
-    ChatChoice,
-    ChatCompletionRequest,
-    ChatCompletionResponse,
-    ChatMessageResponse,
-    ResponsesRequest,
-    ResponsesObject,
-    ResponsesMessage,
-    ResponsesOutputText,
-)
+from .schemas import ChatCompletionRequest, ResponsesRequest
+
+if orjson is not None:
+    _json_bytes = orjson.dumps
+else:  # pragma: no cover - stdlib fallback
+
+    def _json_bytes(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
 
-app = FastAPI()
+# Constant SSE frame heads; only the JSON payload is serialized per frame.
+_SSE_DATA = b"data: "
+_SSE_DONE = b"data: [DONE]\n\n"
+_RESPONSE_CREATED = b"event: response.created\ndata: "
+_RESPONSE_TEXT_DELTA = b"event: response.output_text.delta\ndata: "
+_RESPONSE_TEXT_DONE = b"event: response.output_text.done\ndata: "
+_RESPONSE_COMPLETED = b"event: response.completed\ndata: "
+_RESPONSE_ERROR = b"event: response.error\ndata: "
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
+
+def _sse_frame(payload: Any, head: bytes = _SSE_DATA) -> bytes:
+    """Serialize `payload` straight to an SSE frame without a str round-trip."""
+    return head + _json_bytes(payload) + b"\n\n"
+
+
+# Streamed deltas only vary in their text, so the surrounding JSON envelope is
+# kept as pre-serialized bytes and the text is encoded on its own.
+_CHAT_DELTA_PREFIX = _SSE_DATA + b'{"choices":[{"delta":{"content":'
+_CHAT_DELTA_SUFFIX = b'},"index":0,"finish_reason":null}]}\n\n'
+_RESPONSES_DELTA_SUFFIX = b"}\n\n"
+
+
+# Non-stream bodies have a fixed shape (see ChatCompletionResponse and
+# ResponsesObject in schemas.py), so they are serialized directly instead of
+# being built as Pydantic models and re-encoded by FastAPI. The chat body only
+# varies in its content, so its envelope is kept as bytes like the deltas.
+_CHAT_COMPLETION_PREFIX = (
+    b'{"id":"codex-cli","object":"chat.completion",'
+    b'"choices":[{"index":0,"message":{"role":"assistant","content":'
+)
+_CHAT_COMPLETION_SUFFIX = (
+    b'},"finish_reason":"stop"}],'
+    b'"usage":{"prompt_tokens":0,"completion_tokens":0,"total_tokens":0}}'
 )
 
 
-@app.on_event("startup")
-async def startup_event() -> None:
-    await initialize_model_registry()
+def _chat_completion_body(content: str) -> bytes:
+    return _CHAT_COMPLETION_PREFIX + _json_bytes(content) + _CHAT_COMPLETION_SUFFIX
+
+
+def _responses_object(
+    resp_id: str, msg_id: str, created: int, model: str, text: str
+) -> Dict[str, Any]:
+    return {
+        "id": resp_id,
+        "object": "response",
+        "created": created,
+        "model": model,
+        "status": "completed",
+        "output": [
+            {
+                "id": msg_id,
+                "type": "message",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": text}],
+            }
+        ],
+        # A fresh dict per response: nothing shared for a caller to mutate.
+        "usage": {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0},
+    }
+
+
+# Frames are coalesced into one write until this many bytes are pending or the
+# oldest pending frame has waited this long.
+_SSE_FLUSH_BYTES = 8192
+_SSE_FLUSH_INTERVAL = 0.02
+# Streamed text is merged into one delta event under the same kind of bound.
+_DELTA_MAX_CHARS = 512
+_DELTA_FLUSH_INTERVAL = 0.015
+
+
+async def _iter_batches(
+    items: AsyncIterator[Any], max_size: int, interval: float
+) -> AsyncIterator[List[Any]]:
+    """Group items from `items` into lists with bounded added latency.
+
+    A batch is released once its total `len()` reaches `max_size` or its
+    first item has waited `interval` seconds. The next item is always being
+    fetched as a separate future, so a deadline can pass without cancelling
+    the producer mid-step and the producer keeps running while a released
+    batch is serialized and written downstream.
+    """
+    loop = asyncio.get_running_loop()
+    source = items.__aiter__()
+    pending: List[Any] = []
+    pending_size = 0
+    flush_at = 0.0
+    next_item: Optional[asyncio.Future] = None
+    try:
+        next_item = asyncio.ensure_future(source.__anext__())
+        while True:
+            if pending:
+                done, _ = await asyncio.wait(
+                    (next_item,), timeout=max(0.0, flush_at - loop.time())
+                )
+                if not done:
+                    yield pending
+                    pending, pending_size = [], 0
+                    continue
+            # Wait on the future instead of awaiting it directly, so that a
+            # cancelled consumer does not forward the cancellation into the
+            # producer while it is mid-step; the `finally` below does that once.
+            await asyncio.wait((next_item,))
+            try:
+                item = next_item.result()
+            except StopAsyncIteration:
+                next_item = None
+                break
+            except Exception:
+                # Deliver what the producer sent before it failed, then let
+                # the error reach the caller.
+                next_item = None
+                if pending:
+                    yield pending
+                raise
+            next_item = asyncio.ensure_future(source.__anext__())
+            if not pending:
+                flush_at = loop.time() + interval
+            pending.append(item)
+            pending_size += len(item)
+            if pending_size >= max_size:
+                yield pending
+                pending, pending_size = [], 0
+        if pending:
+            yield pending
+    finally:
+        # Stop and close the producer when the client goes away mid-stream so
+        # the Codex subprocess behind it is torn down promptly. Starlette
+        # cancels the response task through an anyio cancel scope, which
+        # re-cancels every await inside it, so the cleanup is shielded.
+        with anyio.CancelScope(shield=True):
+            if next_item is not None:
+                next_item.cancel()
+                await asyncio.wait((next_item,))
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+
+async def _coalesce_frames(frames: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Merge SSE frames into fewer, larger writes; each frame stays intact."""
+    async with aclosing(_iter_batches(frames, _SSE_FLUSH_BYTES, _SSE_FLUSH_INTERVAL)) as batches:
+        async for batch in batches:
+            yield b"".join(batch)
+
+
+async def _coalesce_text(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Merge streamed text so one delta event carries several Codex chunks."""
+    async with aclosing(_iter_batches(chunks, _DELTA_MAX_CHARS, _DELTA_FLUSH_INTERVAL)) as batches:
+        async for batch in batches:
+            text = "".join(batch)
+            if text:
+                yield text
+
+
+def _is_json_content_type(value: str) -> bool:
+    media_type = value.split(";", 1)[0].strip().lower()
+    maintype, _, subtype = media_type.partition("/")
+    return maintype == "application" and (subtype == "json" or subtype.endswith("+json"))
+
+
+async def _parse_json_body(model: type[BaseModel], request: Request) -> Any:
+    """Validate a raw JSON body in one pass, failing like FastAPI's body parsing.
+
+    pydantic parses the bytes directly, so no intermediate dict is built. As
+    with a FastAPI body parameter, an empty body or an explicit non-JSON
+    Content-Type is rejected with a 422; a missing Content-Type is read as JSON.
+    """
+    body = await request.body()
+    if not body:
+        raise RequestValidationError(
+            [{"type": "missing", "loc": ("body",), "msg": "Field required", "input": None}]
+        )
+    content_type = request.headers.get("content-type")
+    if content_type and not _is_json_content_type(content_type):
+        raise RequestValidationError(
+            [
+                {
+                    "type": "model_attributes_type",
+                    "loc": ("body",),
+                    "msg": "Input should be a valid dictionary or object to extract fields from",
+                    "input": body.decode("utf-8", errors="replace"),
+                }
+            ],
+            body=body,
+        )
+    try:
+        return model.model_validate_json(body)
+    except ValidationError as exc:
+        errors = [
+            {**err, "loc": ("body", *err["loc"])}
+            for err in exc.errors(include_url=False)
+        ]
+        raise RequestValidationError(errors, body=body)
+
+
+def _json_request_body(model: type[BaseModel]) -> Dict[str, Any]:
+    """OpenAPI `requestBody` for handlers that read the raw body themselves."""
+    schema = model.model_json_schema()
+    defs = schema.pop("$defs", {})
+
+    def _inline(node: Any) -> Any:
+        # Nested models are referenced via local `$defs`, which do not resolve
+        # inside an OpenAPI document, so splice them in place.
+        if isinstance(node, dict):
+            ref = node.get("$ref")
+            if isinstance(ref, str) and ref.startswith("#/$defs/"):
+                return _inline(defs[ref.rsplit("/", 1)[1]])
+            return {k: _inline(v) for k, v in node.items()}
+        if isinstance(node, list):
+            return [_inline(v) for v in node]
+        return node
+
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": _inline(schema)}},
+        }
+    }
+
+
+async def _save_images(image_urls: List[str]) -> List[str]:
+    """Save request images concurrently in worker threads.
+
+    Image fetching and decoding block, so they stay off the event loop. If
+    any image fails, the ones already saved are removed and a 400 is raised.
+    """
+    if not image_urls:
+        return []
+    results = await asyncio.gather(
+        *(asyncio.to_thread(save_image_to_temp, u) for u in image_urls),
+        return_exceptions=True,
+    )
+    paths = [r for r in results if isinstance(r, str)]
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        await asyncio.to_thread(_remove_files, paths)
+        if not isinstance(errors[0], ValueError):
+            raise errors[0]
+        raise HTTPException(status_code=400, detail=str(errors[0]))
+    return paths
+
+
+def _remove_files(paths: List[str]) -> None:
+    for p in paths:
+        try:
+            os.remove(p)
+        except Exception:
+            pass
+
+
+# Requests that arrive while startup model discovery is still running wait at
+# most this long before resolving against the model list known so far. A
+# requested name that is not in that list waits for discovery to finish.
+_MODEL_REGISTRY_WAIT = 10.0
+
+
+async def _choose_model(requested: Optional[str]) -> Tuple[str, Optional[str]]:
+    """`choose_model`, without rejecting names while discovery is running."""
+    ready = await wait_for_model_registry(_MODEL_REGISTRY_WAIT)
+    try:
+        return choose_model(requested)
+    except ValueError:
+        if ready:
+            raise
+    await wait_for_model_registry()
+    return choose_model(requested)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # A broken Codex profile must still abort startup, so it is applied here;
+    # only model discovery runs in the background so requests are accepted
+    # right away (endpoints wait for it via `wait_for_model_registry`).
+    apply_codex_profile_overrides()
+    refresh = start_model_registry_refresh()
+    try:
+        yield
+    finally:
+        if not refresh.done():
+            refresh.cancel()
+            await asyncio.wait((refresh,))
+
+
+app = FastAPI(lifespan=lifespan)
+
+_cors_origins = [o.strip() for o in settings.cors_origins.split(",") if o.strip()]
+if _cors_origins:
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=_cors_origins,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+# Compress large non-stream JSON bodies. `text/event-stream` responses are in
+# GZipMiddleware's default exclusion list (Starlette >= 0.46, pinned in
+# requirements.txt), so SSE frames still go out unbuffered.
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 
 @app.get("/v1/models", dependencies=[Depends(rate_limiter), Depends(verify_api_key)])
 async def list_models():
     """Return available model list."""
-    return {"data": [{"id": model} for model in get_available_models(include_reasoning_aliases=True)]}
+    await wait_for_model_registry(_MODEL_REGISTRY_WAIT)
+    return Response(content=get_models_body(), media_type="application/json")
 
 
-@app.post("/v1/chat/completions", dependencies=[Depends(rate_limiter), Depends(verify_api_key)])
-async def chat_completions(req: ChatCompletionRequest):
+@app.post(
+    "/v1/chat/completions",
+    dependencies=[Depends(rate_limiter), Depends(verify_api_key), Depends(require_local_only)],
+    openapi_extra=_json_request_body(ChatCompletionRequest),
+)
+async def chat_completions(request: Request):
+    req: ChatCompletionRequest = await _parse_json_body(ChatCompletionRequest, request)
     try:
-        model_name, alias_effort = choose_model(req.model)
+        model_name, alias_effort = await _choose_model(req.model)
     except ValueError as e:
         raise HTTPException(
             status_code=404,
@@ -65,73 +373,63 @@ async def chat_completions(req: ChatCompletionRequest):
             },
         )
 
-    prompt, image_urls = build_prompt_and_images([m.dict() for m in req.messages])
-    x_overrides = req.x_codex.dict(exclude_none=True) if req.x_codex else {}
-    if alias_effort and "reasoning_effort" not in x_overrides:
-        x_overrides["reasoning_effort"] = alias_effort
-    overrides = x_overrides or None
+    # One serializer call for the whole list instead of one per message.
+    messages = req.model_dump(include={"messages"})["messages"]
+    prompt, image_urls = build_prompt_and_images(messages)
+    # Stays None (no dict at all) unless the request actually overrides something.
+    overrides: Optional[Dict[str, Any]] = None
+    if req.x_codex:
+        overrides = req.x_codex.model_dump(exclude_none=True) or None
+    if alias_effort:
+        if overrides is None:
+            overrides = {"reasoning_effort": alias_effort}
+        else:
+            overrides.setdefault("reasoning_effort", alias_effort)
 
     # Safety gate: only allow danger-full-access when explicitly enabled
     if overrides and overrides.get("sandbox") == "danger-full-access":
         if not settings.allow_danger_full_access:
             raise HTTPException(status_code=400, detail="danger-full-access is disabled by server policy")
 
-    # Enforce local-only model provider when enabled
-    if settings.local_only:
-        try:
-            assert_local_only_or_raise()
-        except ValueError as e:
-            raise HTTPException(status_code=400, detail=str(e))
-
-    image_paths: List[str] = []
-    try:
-        for u in image_urls:
-            image_paths.append(save_image_to_temp(u))
-    except ValueError as e:
-        for p in image_paths:
-            try:
-                os.remove(p)
-            except Exception:
-                pass
-        raise HTTPException(status_code=400, detail=str(e))
+    image_paths = await _save_images(image_urls)
 
     try:
         if req.stream:
             async def event_gen() -> AsyncIterator[bytes]:
-                async for text in run_codex(prompt, overrides, image_paths, model=model_name):
-                    if text:
-                        chunk = {
-                            "choices": [
-                                {"delta": {"content": text}, "index": 0, "finish_reason": None}
-                            ]
-                        }
-                        yield f"data: {json.dumps(chunk)}\n\n".encode()
-                yield b"data: [DONE]\n\n"
-
-            return StreamingResponse(event_gen(), media_type="text/event-stream")
+                codex_text = run_codex(prompt, overrides, image_paths, model=model_name)
+                # `async for` does not close what it iterates; aclosing makes a
+                # client disconnect tear the Codex process down right away.
+                async with aclosing(_coalesce_text(codex_text)) as texts:
+                    async for text in texts:
+                        if text:
+                            yield _CHAT_DELTA_PREFIX + _json_bytes(text) + _CHAT_DELTA_SUFFIX
+                yield _SSE_DONE
+
+            return StreamingResponse(
+                _coalesce_frames(event_gen()), media_type="text/event-stream"
+            )
         else:
             final = await run_codex_last_message(prompt, overrides, image_paths, model=model_name)
-            resp = ChatCompletionResponse(
-                choices=[ChatChoice(message=ChatMessageResponse(content=final))]
-            )
-            return resp
+            return Response(content=_chat_completion_body(final), media_type="application/json")
     except CodexError as e:
         raise HTTPException(
             status_code=500,
             detail={"message": str(e), "type": "server_error", "code": None},
         )
     finally:
-        for p in image_paths:
-            try:
-                os.remove(p)
-            except Exception:
-                pass
+        if image_paths:
+            await asyncio.to_thread(_remove_files, image_paths)
 
 
-@app.post("/v1/responses", dependencies=[Depends(rate_limiter), Depends(verify_api_key)])
-async def responses_endpoint(req: ResponsesRequest):
+@app.post(
+    "/v1/responses",
+    dependencies=[Depends(rate_limiter), Depends(verify_api_key), Depends(require_local_only)],
+    openapi_extra=_json_request_body(ResponsesRequest),
+)
+async def responses_endpoint(request: Request):
+    req: ResponsesRequest = await _parse_json_body(ResponsesRequest, request)
     try:
-        model, alias_effort = choose_model(req.model)
+        model, alias_effort = await _choose_model(req.model)
     except ValueError as e:
         raise HTTPException(
             status_code=404,
@@ -148,38 +446,20 @@ async def responses_endpoint(req: ResponsesRequest):
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-    overrides = {}
-    if alias_effort:
-        overrides["reasoning_effort"] = alias_effort
-    if req.reasoning and req.reasoning.effort:
-        overrides["reasoning_effort"] = req.reasoning.effort
-
-    # Enforce local-only model provider when enabled
-    if settings.local_only:
-        try:
-            assert_local_only_or_raise()
-        except ValueError as e:
-            raise HTTPException(status_code=400, detail=str(e))
+    # An explicit reasoning.effort wins over the effort implied by a model alias.
+    effort = (req.reasoning.effort if req.reasoning else None) or alias_effort
+    codex_overrides = {"reasoning_effort": effort} if effort else None
 
     prompt, image_urls = build_prompt_and_images(messages)
 
-    resp_id = f"resp_{uuid.uuid4().hex}"
-    msg_id = f"msg_{uuid.uuid4().hex}"
+    # One random draw covers both ids (32 hex chars each, as with uuid4().hex).
+    rand = secrets.token_hex(32)
+    resp_id = "resp_" + rand[:32]
+    msg_id = "msg_" + rand[32:]
     created = int(time.time())
     response_model = req.model or model
-    codex_overrides = overrides or None
 
-    image_paths: List[str] = []
-    try:
-        for u in image_urls:
-            image_paths.append(save_image_to_temp(u))
-    except ValueError as e:
-        for p in image_paths:
-            try:
-                os.remove(p)
-            except Exception:
-                pass
-        raise HTTPException(status_code=400, detail=str(e))
+    image_paths = await _save_images(image_urls)
 
     try:
         if req.stream:
@@ -192,67 +472,56 @@ async def responses_endpoint(req: ResponsesRequest):
                         "model": response_model,
                         "status": "in_progress",
                     }
-                    yield f"event: response.created\ndata: {json.dumps(created_evt)}\n\n".encode()
+                    yield _sse_frame(created_evt, _RESPONSE_CREATED)
 
-                    buf: list[str] = []
-                    async for text in run_codex(prompt, codex_overrides, image_paths, model=model):
-                        if text:
-                            buf.append(text)
-                            delta_evt = {"id": resp_id, "delta": text}
-                            yield f"event: response.output_text.delta\ndata: {json.dumps(delta_evt)}\n\n".encode()
+                    delta_prefix = (
+                        _RESPONSE_TEXT_DELTA
+                        + b'{"id":'
+                        + _json_bytes(resp_id)
+                        + b',"delta":'
+                    )
+                    buf = io.StringIO()
+                    codex_text = run_codex(prompt, codex_overrides, image_paths, model=model)
+                    async with aclosing(_coalesce_text(codex_text)) as texts:
+                        async for text in texts:
+                            if text:
+                                buf.write(text)
+                                yield delta_prefix + _json_bytes(text) + _RESPONSES_DELTA_SUFFIX
 
-                    final_text = "".join(buf)
+                    final_text = buf.getvalue()
                     done_evt = {"id": resp_id, "text": final_text}
-                    yield f"event: response.output_text.done\ndata: {json.dumps(done_evt)}\n\n".encode()
-
-                    final_obj = ResponsesObject(
-                        id=resp_id,
-                        created=created,
-                        model=response_model,
-                        status="completed",
-                        output=[
-                            ResponsesMessage(
-                                id=msg_id,
-                                content=[ResponsesOutputText(text=final_text)],
-                            )
-                        ],
-                    ).model_dump()
-                    yield f"event: response.completed\ndata: {json.dumps(final_obj)}\n\n".encode()
+                    yield _sse_frame(done_evt, _RESPONSE_TEXT_DONE)
+
+                    final_obj = _responses_object(
+                        resp_id, msg_id, created, response_model, final_text
+                    )
+                    yield _sse_frame(final_obj, _RESPONSE_COMPLETED)
                 except CodexError as e:
                     err_evt = {"id": resp_id, "error": {"message": str(e)}}
-                    yield f"event: response.error\ndata: {json.dumps(err_evt)}\n\n".encode()
-                finally:
-                    yield b"data: [DONE]\n\n"
+                    yield _sse_frame(err_evt, _RESPONSE_ERROR)
+                # Not in a `finally`: yielding while the generator is being
+                # closed (client gone) raises instead of closing it.
+                yield _SSE_DONE
 
             headers = {
                 "Cache-Control": "no-cache",
                 "X-Accel-Buffering": "no",
                 "Connection": "keep-alive",
             }
-            return StreamingResponse(event_gen(), media_type="text/event-stream", headers=headers)
+            return StreamingResponse(
+                _coalesce_frames(event_gen()),
+                media_type="text/event-stream",
+                headers=headers,
+            )
         else:
             final = await run_codex_last_message(prompt, codex_overrides, image_paths, model=model)
-            resp = ResponsesObject(
-                id=resp_id,
-                created=created,
-                model=response_model,
-                status="completed",
-                output=[
-                    ResponsesMessage(
-                        id=msg_id,
-                        content=[ResponsesOutputText(text=final)],
-                    )
-                ],
-            )
-            return resp
+            body = _json_bytes(_responses_object(resp_id, msg_id, created, response_model, final))
+            return Response(content=body, media_type="application/json")
     except CodexError as e:
         raise HTTPException(
             status_code=500,
             detail={"message": str(e), "type": "server_error", "code": None},
         )
     finally:
-        for p in image_paths:
-            try:
-                os.remove(p)
-            except Exception:
-                pass
+        if image_paths:
+            await asyncio.to_thread(_remove_files, image_paths)
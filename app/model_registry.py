@@ -1,9 +1,17 @@
 """Utility helpers for discovering and caching Codex models."""
 
+import asyncio
+import functools
+import json
 import logging
 import os
 from typing import List, Optional, Tuple
 
+try:
+    import orjson
+except ModuleNotFoundError:  # pragma: no cover - optional speedup
+    orjson = None  # type: ignore
+
 from .codex import CodexError, apply_codex_profile_overrides, list_codex_models
 
 logger = logging.getLogger(__name__)
@@ -11,6 +19,8 @@ logger = logging.getLogger(__name__)
 DEFAULT_MODEL = "codex-cli"
 _AVAILABLE_MODELS: List[str] = [DEFAULT_MODEL]
 _LAST_ERROR: Optional[str] = None
+_MODELS_BODY: Optional[bytes] = None
+_REFRESH_TASK: Optional["asyncio.Future[List[str]]"] = None
 _WARNED_LEGACY_ENV = False
 
 REASONING_EFFORT_SUFFIXES = ("minimal", "low", "medium", "high")
@@ -36,10 +46,16 @@ def _augment_models(models: List[str]) -> List[str]:
 async def initialize_model_registry() -> List[str]:
     """Populate the available model list by querying the Codex CLI."""
 
-    global _AVAILABLE_MODELS, _LAST_ERROR
+    apply_codex_profile_overrides()
+    return await refresh_model_registry()
+
+
+async def refresh_model_registry() -> List[str]:
+    """Re-run model discovery without re-applying the Codex profile."""
+
+    global _AVAILABLE_MODELS, _LAST_ERROR, _MODELS_BODY
 
     _warn_if_legacy_env_present()
-    apply_codex_profile_overrides()
 
     try:
         models = await list_codex_models()
@@ -55,9 +71,47 @@ async def initialize_model_registry() -> List[str]:
             exc,
         )
         _AVAILABLE_MODELS = _augment_models([DEFAULT_MODEL])
+    choose_model.cache_clear()
+    _MODELS_BODY = None
     return list(_AVAILABLE_MODELS)
 
 
+def start_model_registry_refresh() -> "asyncio.Future[List[str]]":
+    """Run `refresh_model_registry` in the background.
+
+    The default model list is served until discovery finishes. A refresh that
+    is already running is reused rather than started twice. The Codex profile
+    is not applied here; callers do that first so its errors surface.
+    """
+
+    global _REFRESH_TASK
+    if _REFRESH_TASK is None or _REFRESH_TASK.done():
+        _REFRESH_TASK = asyncio.ensure_future(refresh_model_registry())
+        _REFRESH_TASK.add_done_callback(_log_refresh_failure)
+    return _REFRESH_TASK
+
+
+def _log_refresh_failure(task: "asyncio.Future[List[str]]") -> None:
+    if task.cancelled():
+        return
+    exc = task.exception()
+    if exc is not None:
+        logger.error("Background Codex model discovery failed", exc_info=exc)
+
+
+async def wait_for_model_registry(timeout: Optional[float] = None) -> bool:
+    """Wait up to `timeout` seconds for a background refresh to finish.
+
+    Returns True when no refresh is still running afterwards.
+    """
+
+    task = _REFRESH_TASK
+    if task is None or task.done():
+        return True
+    await asyncio.wait((task,), timeout=timeout)
+    return task.done()
+
+
 def get_available_models(include_reasoning_aliases: bool = False) -> List[str]:
     """Return a copy of the currently cached model list."""
 
@@ -70,14 +124,38 @@ def get_available_models(include_reasoning_aliases: bool = False) -> List[str]:
     return models
 
 
+def get_models_body() -> bytes:
+    """Return the serialized `/v1/models` payload for the current model list.
+
+    The bytes are built on first use and dropped by `refresh_model_registry`.
+    """
+
+    global _MODELS_BODY
+    if _MODELS_BODY is None:
+        payload = {
+            "data": [{"id": model} for model in get_available_models(include_reasoning_aliases=True)]
+        }
+        if orjson is not None:
+            _MODELS_BODY = orjson.dumps(payload)
+        else:  # pragma: no cover - stdlib fallback
+            _MODELS_BODY = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+    return _MODELS_BODY
+
+
 def get_default_model() -> str:
     """Return the default model name used when clients omit `model`."""
 
     return _AVAILABLE_MODELS[0] if _AVAILABLE_MODELS else DEFAULT_MODEL
 
 
+@functools.lru_cache(maxsize=512)
 def choose_model(requested: Optional[str]) -> Tuple[str, Optional[str]]:
-    """Validate the requested model name and return the model plus optional reasoning effort."""
+    """Validate the requested model name and return the model plus optional reasoning effort.
+
+    Results are memoized per requested name; `refresh_model_registry`
+    clears the cache whenever the model list changes. Rejected names raise
+    and are therefore never cached.
+    """
 
     if requested:
         base_model, effort = _split_model_and_effort(requested)
@@ -1,5 +1,8 @@
 from typing import List, Dict, Any, Tuple
 
+# A tuple rather than a set: client-sent `type` values may be unhashable.
+_TEXT_PART_TYPES = ("text", "input_text")
+
 
 def _content_to_text(content: Any) -> str:
     """Best-effort conversion of message `content` into plain text.
@@ -13,12 +16,21 @@ def _content_to_text(content: Any) -> str:
     if isinstance(content, str):
         return content
     if isinstance(content, list):
+        # Fast path for the common single text part.
+        if len(content) == 1:
+            p = content[0]
+            if isinstance(p, str):
+                return p
+            if isinstance(p, dict) and p.get("type") in _TEXT_PART_TYPES:
+                text = p.get("text")
+                if isinstance(text, str):
+                    return text
         # Typed parts (OpenAI-style content parts)
         parts: List[str] = []
         for p in content:
             if isinstance(p, dict):
                 t = p.get("type")
-                if t in ("text", "input_text") and isinstance(p.get("text"), str):
+                if t in _TEXT_PART_TYPES and isinstance(p.get("text"), str):
                     parts.append(p["text"])
                 # Ignore non-text parts (images, tool calls, etc.)
             elif isinstance(p, str):
@@ -53,33 +65,29 @@ def _extract_images(content: Any) -> List[str]:
 def build_prompt_and_images(messages: List[Dict[str, Any]]) -> Tuple[str, List[str]]:
     """Convert chat messages into a prompt string and collect image URLs."""
     system_parts: List[str] = []
-    convo: List[Dict[str, Any]] = []
+    convo_lines: List[str] = []
     images: List[str] = []
 
+    # Single pass: conversation lines are formatted as they are seen, and
+    # system text is collected separately because it is emitted first.
     for m in messages:
         role = (m.get("role") or "").strip().lower()
-        # Treat 'developer' as 'system' for compatibility
-        normalized_role = "system" if role == "developer" else role
         content = m.get("content")
         images.extend(_extract_images(content))
         text = _content_to_text(content)
-        if normalized_role == "system":
+        # Treat 'developer' as 'system' for compatibility
+        if role == "system" or role == "developer":
             if text:
                 system_parts.append(text.strip())
+        elif role == "user" or not role:
+            convo_lines.append("User: " + text.strip())
         else:
-            convo.append({"role": normalized_role or "user", "content": text})
+            convo_lines.append("Assistant: " + text.strip())
 
-    lines: List[str] = []
+    convo_lines.append("Assistant:")
     if system_parts:
-        lines.append("\n".join(system_parts))
-        lines.append("")
-
-    for msg in convo:
-        role = "User" if msg["role"] == "user" else "Assistant"
-        lines.append(f"{role}: {msg['content'].strip()}")
-
-    lines.append("Assistant:")
-    return "\n".join(lines), images
+        return "\n".join(system_parts) + "\n\n" + "\n".join(convo_lines), images
+    return "\n".join(convo_lines), images
 
 
 def normalize_responses_input(inp: Any) -> List[Dict[str, Any]]:
@@ -95,19 +103,27 @@ def normalize_responses_input(inp: Any) -> List[Dict[str, Any]]:
         return [{"role": "user", "content": inp}]
 
     if isinstance(inp, list):
-        # list of dict with type field (content parts)
-        if inp and isinstance(inp[0], dict) and "type" in inp[0] and "role" not in inp[0]:
-            return [{"role": "user", "content": inp}]
-
-        # list of dict with role/content (chat-like)
-        if all(isinstance(x, dict) and "role" in x and "content" in x for x in inp):
+        if not inp:
+            return []
+        # `input` is typed as Any, so the first element picks the variant and
+        # the rest is still checked while it is converted.
+        first = inp[0]
+        if isinstance(first, dict):
+            # list of dict with type field (content parts)
+            if "type" in first and "role" not in first:
+                return [{"role": "user", "content": inp}]
+
+            # list of dict with role/content (chat-like)
             msgs: List[Dict[str, Any]] = []
             for x in inp:
-                msgs.append({"role": str(x.get("role")), "content": x.get("content")})
-            return msgs
+                if not (isinstance(x, dict) and "role" in x and "content" in x):
+                    break
+                msgs.append({"role": str(x["role"]), "content": x["content"]})
+            else:
+                return msgs
 
         # list of str → concatenate
-        if all(isinstance(x, str) for x in inp):
+        elif isinstance(first, str) and all(isinstance(x, str) for x in inp):
             return [{"role": "user", "content": "".join(inp)}]
 
     raise ValueError("Unsupported input format for Responses API")
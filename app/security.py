@@ -21,7 +21,7 @@ def _is_local_url(url: str) -> bool:
     if not url:
         return False
     u = url.strip()
-    if u.startswith("unix://") or u.startswith("http+unix://"):
+    if u.startswith(("unix://", "http+unix://")):
         return True
     m = re.match(r"^(?P<scheme>https?)://(?P<host>\[[^\]]+\]|[^/:]+)(?::\d+)?(/|$)", u, re.IGNORECASE)
     if not m:
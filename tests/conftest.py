@@ -0,0 +1,116 @@
+import asyncio
+import json
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from app import codex, main, model_registry
+
+
+class AsgiResult:
+    def __init__(self, status: int, headers: Dict[str, str], chunks: List[bytes]) -> None:
+        self.status = status
+        self.headers = headers
+        self.chunks = chunks
+        self.body = b"".join(chunks)
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+async def call_asgi(
+    app: Any,
+    method: str,
+    path: str,
+    *,
+    json_body: Any = None,
+    body: Optional[bytes] = None,
+    headers: Optional[Dict[str, str]] = None,
+    disconnect_after_chunks: Optional[int] = None,
+    raise_app_exceptions: bool = True,
+) -> AsgiResult:
+    """Drive `app` with a single HTTP request without an HTTP client library.
+
+    With `raise_app_exceptions=False` an exception escaping the app (e.g. a
+    stream failing after the response started) is swallowed so the partial
+    response can be inspected, like a client that saw the connection drop.
+    """
+
+    if json_body is not None:
+        body = json.dumps(json_body).encode()
+        headers = {"content-type": "application/json", **(headers or {})}
+    status = 0
+    response_headers: Dict[str, str] = {}
+    chunks: List[bytes] = []
+    request_sent = False
+    disconnected = asyncio.Event()
+
+    async def receive() -> Dict[str, Any]:
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body or b"", "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: Dict[str, Any]) -> None:
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers.update(
+                {k.decode().lower(): v.decode() for k, v in message.get("headers", [])}
+            )
+        elif message["type"] == "http.response.body":
+            if message.get("body"):
+                chunks.append(message["body"])
+            if disconnect_after_chunks is not None and len(chunks) >= disconnect_after_chunks:
+                disconnected.set()
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "client": ("127.0.0.1", 12345),
+        "server": ("testserver", 80),
+        "scheme": "http",
+        "root_path": "",
+    }
+    try:
+        await app(scope, receive, send)
+    except Exception:
+        if raise_app_exceptions:
+            raise
+    return AsgiResult(status, response_headers, chunks)
+
+
+@pytest.fixture(autouse=True)
+def codex_caches():
+    """Keep executable, environment and ensured-dir caches from leaking between tests."""
+
+    codex._clear_codex_caches()
+    yield
+    codex._clear_codex_caches()
+
+
+@pytest.fixture
+def main_client(monkeypatch):
+    """Call `app.main.app` with Codex stubbed out and a fixed model list."""
+
+    monkeypatch.setattr(main.settings, "rate_limit_per_minute", 0, raising=False)
+    monkeypatch.setattr(main.settings, "proxy_api_key", None, raising=False)
+    monkeypatch.setattr(main.settings, "local_only", False, raising=False)
+    monkeypatch.setattr(model_registry, "_AVAILABLE_MODELS", ["gpt-5"])
+    monkeypatch.setattr(model_registry, "_MODELS_BODY", None)
+    monkeypatch.setattr(model_registry, "_REFRESH_TASK", None)
+    model_registry.choose_model.cache_clear()
+
+    def _call(method: str, path: str, **kwargs: Any) -> AsgiResult:
+        return asyncio.run(call_asgi(main.app, method, path, **kwargs))
+
+    yield _call
+    model_registry.choose_model.cache_clear()
@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from app import codex
+
+
+def _make_fake_codex(path):
+    path.write_text("#!/bin/sh\nexit 0\n", encoding="utf-8")
+    path.chmod(0o755)
+    return path
+
+
+def test_resolve_codex_executable_is_cached_per_setting(monkeypatch, tmp_path):
+    first = _make_fake_codex(tmp_path / "codex-a")
+    second = _make_fake_codex(tmp_path / "codex-b")
+    codex._resolve_codex_executable.cache_clear()
+
+    monkeypatch.setattr(codex.settings, "codex_path", str(first), raising=False)
+    assert codex._resolve_codex_executable() == str(first)
+
+    # Changing CODEX_PATH resolves the new binary instead of a stale entry.
+    monkeypatch.setattr(codex.settings, "codex_path", str(second), raising=False)
+    assert codex._resolve_codex_executable() == str(second)
+
+    # A cached hit skips the filesystem probe until the cache is cleared.
+    second.unlink()
+    assert codex._resolve_codex_executable() == str(second)
+    codex._resolve_codex_executable.cache_clear()
+    with pytest.raises(codex.CodexError):
+        codex._resolve_codex_executable()
+
+
+def test_refresh_codex_executable_picks_up_replaced_binary(monkeypatch, tmp_path):
+    bin_a = tmp_path / "a"
+    bin_b = tmp_path / "b"
+    bin_a.mkdir()
+    bin_b.mkdir()
+    _make_fake_codex(bin_b / "codex")
+    monkeypatch.setattr(codex.settings, "codex_path", "codex", raising=False)
+    monkeypatch.setenv("PATH", f"{bin_a}{os.pathsep}{bin_b}")
+    codex._resolve_codex_executable.cache_clear()
+
+    assert codex._resolve_codex_executable() == str(bin_b / "codex")
+
+    # A newer binary earlier on PATH is only seen after an explicit refresh.
+    _make_fake_codex(bin_a / "codex")
+    assert codex._resolve_codex_executable() == str(bin_b / "codex")
+    assert codex.refresh_codex_executable() == str(bin_a / "codex")
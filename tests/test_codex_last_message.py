@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from app import codex
+
+
+FAKE_CODEX = """#!/bin/sh
+out=""
+while [ "$#" -gt 0 ]; do
+  if [ "$1" = "--output-last-message" ]; then
+    out="$2"
+  fi
+  shift
+done
+echo '{"msg": {"type": "task_started"}}'
+printf 'Final answer.\\n' > "$out"
+"""
+
+
+@pytest.mark.parametrize("use_memfd", [True, False])
+def test_run_codex_last_message_reads_output_file(monkeypatch, tmp_path, use_memfd):
+    if use_memfd and not codex._USE_MEMFD:
+        pytest.skip("memfd_create is not available on this platform")
+    fake_codex = tmp_path / "codex"
+    fake_codex.write_text(FAKE_CODEX, encoding="utf-8")
+    fake_codex.chmod(0o755)
+    monkeypatch.setattr(codex.settings, "codex_path", str(fake_codex), raising=False)
+    monkeypatch.setattr(codex.settings, "codex_workdir", str(tmp_path), raising=False)
+    monkeypatch.setattr(codex.settings, "timeout_seconds", 5, raising=False)
+    monkeypatch.setattr(codex, "_USE_MEMFD", use_memfd)
+
+    result = asyncio.run(codex.run_codex_last_message("prompt"))
+
+    assert result == "Final answer."
+    assert not list(tmp_path.glob("codex-last-*"))
+
+
+@pytest.mark.parametrize("use_memfd", [True, False])
+def test_run_codex_last_message_rejects_missing_output(monkeypatch, tmp_path, use_memfd):
+    if use_memfd and not codex._USE_MEMFD:
+        pytest.skip("memfd_create is not available on this platform")
+    fake_codex = tmp_path / "codex"
+    # Exits cleanly but never writes the --output-last-message file.
+    fake_codex.write_text(
+        "#!/bin/sh\necho '{\"msg\": {\"type\": \"task_started\"}}'\n", encoding="utf-8"
+    )
+    fake_codex.chmod(0o755)
+    monkeypatch.setattr(codex.settings, "codex_path", str(fake_codex), raising=False)
+    monkeypatch.setattr(codex.settings, "codex_workdir", str(tmp_path), raising=False)
+    monkeypatch.setattr(codex.settings, "timeout_seconds", 5, raising=False)
+    monkeypatch.setattr(codex, "_USE_MEMFD", use_memfd)
+
+    with pytest.raises(codex.CodexError, match="without writing a final message"):
+        asyncio.run(codex.run_codex_last_message("prompt"))
+
+    assert not list(tmp_path.glob("codex-last-*"))
@@ -1,4 +1,8 @@
+import asyncio
 import json
+import os
+
+import pytest
 
 from app import codex
 
@@ -38,3 +42,175 @@ def test_parse_model_listing_infers_codex_from_plaintext():
     assert "gpt-5-codex" in models
     assert "gpt-5-mini-codex" in models
     assert "o4-mini-codex" not in models
+
+
+def test_probe_models_via_proto_reads_session_configured(monkeypatch, tmp_path):
+    fake_codex = tmp_path / "codex"
+    fake_codex.write_text(
+        "#!/bin/sh\n"
+        "echo 'starting up'\n"
+        "echo '{\"id\":\"\",\"msg\":{\"type\":\"session_configured\",\"model\":\"gpt-5-codex\"}}'\n"
+        "read line\n",
+        encoding="utf-8",
+    )
+    fake_codex.chmod(0o755)
+    monkeypatch.setattr(codex.settings, "codex_workdir", str(tmp_path), raising=False)
+    monkeypatch.setattr(codex.settings, "timeout_seconds", 5, raising=False)
+
+    models = asyncio.run(codex._probe_models_via_proto(str(fake_codex)))
+
+    assert models == ["gpt-5-codex"]
+
+
+def test_list_codex_models_caches_successful_listing(monkeypatch, tmp_path):
+    calls = tmp_path / "calls.log"
+    fake_codex = tmp_path / "codex"
+    fake_codex.write_text(
+        "#!/bin/sh\n"
+        f"echo run >> '{calls}'\n"
+        "echo '{\"data\": [{\"id\": \"gpt-5\"}]}'\n",
+        encoding="utf-8",
+    )
+    fake_codex.chmod(0o755)
+    monkeypatch.setattr(codex.settings, "codex_path", str(fake_codex), raising=False)
+    monkeypatch.setattr(codex.settings, "codex_workdir", str(tmp_path), raising=False)
+    monkeypatch.setattr(codex.settings, "timeout_seconds", 5, raising=False)
+    codex.list_codex_models.cache_clear()
+
+    try:
+        first = asyncio.run(codex.list_codex_models())
+        runs_after_first = calls.read_text(encoding="utf-8").count("run")
+        second = asyncio.run(codex.list_codex_models())
+    finally:
+        codex.list_codex_models.cache_clear()
+
+    assert first == second == ["gpt-5"]
+    assert calls.read_text(encoding="utf-8").count("run") == runs_after_first
+
+
+def test_list_codex_models_coalesces_concurrent_callers(monkeypatch, tmp_path):
+    calls = tmp_path / "calls.log"
+    fake_codex = tmp_path / "codex"
+    fake_codex.write_text(
+        "#!/bin/sh\n"
+        f"echo \"$*\" >> '{calls}'\n"
+        "sleep 0.1\n"
+        "echo '{\"data\": [{\"id\": \"gpt-5\"}]}'\n",
+        encoding="utf-8",
+    )
+    fake_codex.chmod(0o755)
+    monkeypatch.setattr(codex.settings, "codex_path", str(fake_codex), raising=False)
+    monkeypatch.setattr(codex.settings, "codex_workdir", str(tmp_path), raising=False)
+    monkeypatch.setattr(codex.settings, "timeout_seconds", 5, raising=False)
+    codex.list_codex_models.cache_clear()
+
+    async def _list_concurrently():
+        return await asyncio.gather(*(codex.list_codex_models() for _ in range(3)))
+
+    try:
+        results = asyncio.run(_list_concurrently())
+    finally:
+        codex.list_codex_models.cache_clear()
+
+    assert results == [["gpt-5"]] * 3
+    runs = calls.read_text(encoding="utf-8").splitlines()
+    assert runs.count("models list --json") == 1
+
+
+@pytest.mark.parametrize("probe_concurrency", [1, 4])
+def test_list_codex_models_prefers_higher_priority_attempt(
+    monkeypatch, tmp_path, probe_concurrency
+):
+    # `models list --json` is slow but must still win over the faster
+    # plaintext variants that are launched alongside it.
+    fake_codex = tmp_path / "codex"
+    fake_codex.write_text(
+        "#!/bin/sh\n"
+        "if [ \"$2\" = \"list\" ] && [ \"$3\" = \"--json\" ]; then\n"
+        "  sleep 0.3\n"
+        "  echo '{\"data\": [{\"id\": \"from-json\"}]}'\n"
+        "  exit 0\n"
+        "fi\n"
+        "echo 'from-plaintext'\n",
+        encoding="utf-8",
+    )
+    fake_codex.chmod(0o755)
+    monkeypatch.setattr(codex.settings, "codex_path", str(fake_codex), raising=False)
+    monkeypatch.setattr(codex.settings, "codex_workdir", str(tmp_path), raising=False)
+    monkeypatch.setattr(codex.settings, "timeout_seconds", 5, raising=False)
+    monkeypatch.setattr(codex, "_MODELS_PROBE_CONCURRENCY", probe_concurrency)
+    codex.list_codex_models.cache_clear()
+
+    try:
+        models = asyncio.run(codex.list_codex_models())
+    finally:
+        codex.list_codex_models.cache_clear()
+
+    assert models == ["from-json"]
+
+
+def test_models_from_config_reuses_parse_until_file_changes(monkeypatch, tmp_path):
+    config = tmp_path / "config.toml"
+    config.write_text('model = "gpt-5-codex"\n', encoding="utf-8")
+    monkeypatch.setattr(codex.settings, "codex_config_dir", str(tmp_path), raising=False)
+
+    loads = []
+    real_load = codex.tomllib.load
+
+    def _counting_load(fh):
+        loads.append(fh.name)
+        return real_load(fh)
+
+    monkeypatch.setattr(codex.tomllib, "load", _counting_load)
+
+    assert codex._models_from_config() == ["gpt-5-codex", "gpt-5"]
+    assert codex._models_from_config() == ["gpt-5-codex", "gpt-5"]
+    assert len(loads) == 1
+
+    config.write_text('model = "o3"\n', encoding="utf-8")
+    os.utime(config, ns=(0, 1))
+    assert codex._models_from_config() == ["o3"]
+    assert len(loads) == 2
+
+
+def test_losing_probes_cancelled_mid_spawn_are_reaped(monkeypatch, tmp_path):
+    monkeypatch.setattr(codex.settings, "codex_workdir", str(tmp_path), raising=False)
+    monkeypatch.setattr(codex.settings, "timeout_seconds", 5, raising=False)
+    monkeypatch.setattr(codex, "_MODELS_PROBE_CONCURRENCY", 4)
+    monkeypatch.setattr(codex, "_build_codex_env", lambda: {})
+    spawned = []
+
+    class FakeProcess:
+        def __init__(self, cmd):
+            self.cmd = cmd
+            self.returncode = None
+            self.reaped = False
+
+        async def communicate(self):
+            self.returncode = 0
+            self.reaped = True
+            return b'{"data": [{"id": "gpt-5"}]}', b""
+
+        def kill(self):
+            self.returncode = -9
+
+        async def wait(self):
+            self.reaped = True
+            return self.returncode
+
+    async def fake_create_subprocess_exec(*cmd, **kwargs):
+        # Like the real call, the child exists before the pipes are connected.
+        proc = FakeProcess(cmd)
+        spawned.append(proc)
+        if cmd[1:] != ("models", "list", "--json"):
+            await asyncio.sleep(0.05)
+        return proc
+
+    monkeypatch.setattr(codex.asyncio, "create_subprocess_exec", fake_create_subprocess_exec)
+
+    models = asyncio.run(codex._discover_codex_models("codex"))
+
+    assert models == ["gpt-5"]
+    assert len(spawned) == 4
+    assert all(proc.reaped for proc in spawned)
+    assert [proc.returncode for proc in spawned[1:]] == [-9, -9, -9]
@@ -1,6 +1,9 @@
+import asyncio
 from pathlib import Path
 import sys
 
+import pytest
+
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
 from app import codex
@@ -35,6 +38,22 @@ def test_sanitize_codex_text_removes_metadata():
     assert cleaned == EXPECTED_TEXT
 
 
+def test_sanitize_last_message_matches_line_filter():
+    payloads = [
+        SAMPLE_OUTPUT,
+        "[2025-09-18T23:15:14] codex\n\nAnswer here.\n  \nMore\n[2025-09-18T23:15:15] tokens used: 1\n",
+        "workdir: /x\nmodel: gpt-5\n\n  indented answer\n🌐 Searched: foo\nlast\n\n\n",
+        "plain answer",
+    ]
+    for payload in payloads:
+        assert codex._sanitize_last_message_text(payload) == codex._sanitize_codex_text(payload)
+
+
+def test_sanitize_last_message_keeps_clean_payload_verbatim():
+    payload = "\nHere is the summary.\n\nModel: the data model is unchanged.\n"
+    assert codex._sanitize_last_message_text(payload) == payload.strip()
+
+
 def test_codex_output_filter_streaming():
     filt = codex._CodexOutputFilter()
     collected: list[str] = []
@@ -45,6 +64,31 @@ def test_codex_output_filter_streaming():
     assert "".join(collected).rstrip("\n") == EXPECTED_TEXT
 
 
+def test_codex_output_filter_raw_prefilter_is_equivalent():
+    filt = codex._CodexOutputFilter()
+    collected: list[str] = []
+    for raw_line in SAMPLE_OUTPUT.encode().splitlines(keepends=True):
+        if filt.drops_raw(raw_line):
+            continue
+        processed = filt.process(raw_line.decode())
+        if processed:
+            collected.append(processed)
+    assert "".join(collected).rstrip("\n") == EXPECTED_TEXT
+
+
+@pytest.mark.parametrize("line", ["retrying ", "retrying \t", "Retrying  "])
+def test_bare_retrying_line_is_kept_on_every_path(line):
+    # The line filter strips the line first, so "retrying" alone is not the
+    # "retrying " prefix; the raw prefilter and whole-payload pass must agree.
+    payload = f"workdir: /x\n{line}\nRetrying request in 1s\nanswer\n"
+
+    assert codex._sanitize_codex_text(payload) == f"{line}\nanswer"
+    assert codex._sanitize_last_message_text(payload) == codex._sanitize_codex_text(payload)
+    filt = codex._CodexOutputFilter()
+    assert not filt.drops_raw(f"{line}\n".encode())
+    assert filt.drops_raw(b"Retrying request in 1s\n")
+
+
 def test_user_block_is_removed():
     filt = codex._CodexOutputFilter()
     lines = [
@@ -57,3 +101,42 @@ def test_user_block_is_removed():
     out = [filt.process(line) for line in lines]
     rendered = "".join(part for part in out if part)
     assert rendered.strip() == "神戸の天気は快晴です。"
+
+
+def test_iter_stream_lines_splits_chunked_reads():
+    async def _collect() -> list[bytes]:
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"first\nsec")
+        reader.feed_data(b"ond\n\nthird")
+        reader.feed_eof()
+        return [line async for line in codex._iter_stream_lines(reader)]
+
+    assert asyncio.run(_collect()) == [b"first\n", b"second\n", b"\n", b"third"]
+
+
+def test_iter_stream_lines_handles_lines_spanning_small_reads(monkeypatch):
+    monkeypatch.setattr(codex, "_STREAM_READ_SIZE", 3)
+
+    async def _collect() -> list[bytes]:
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"a long line\nx\ny\n\ntail")
+        reader.feed_eof()
+        return [line async for line in codex._iter_stream_lines(reader)]
+
+    assert asyncio.run(_collect()) == [b"a long line\n", b"x\n", b"y\n", b"\n", b"tail"]
+
+
+def test_run_codex_streams_filtered_text(monkeypatch, tmp_path):
+    fake_codex = tmp_path / "codex"
+    fake_codex.write_text(
+        "#!/bin/sh\ncat <<'EOF'\n" + SAMPLE_OUTPUT + "EOF\n", encoding="utf-8"
+    )
+    fake_codex.chmod(0o755)
+    monkeypatch.setattr(codex.settings, "codex_path", str(fake_codex), raising=False)
+    monkeypatch.setattr(codex.settings, "codex_workdir", str(tmp_path), raising=False)
+
+    async def _collect() -> list[str]:
+        return [chunk async for chunk in codex.run_codex("prompt")]
+
+    chunks = asyncio.run(_collect())
+    assert "".join(chunks).rstrip("\n") == EXPECTED_TEXT
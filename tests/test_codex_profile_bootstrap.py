@@ -1,4 +1,5 @@
 import logging
+import shutil
 
 import pytest
 
@@ -117,3 +118,37 @@ def test_apply_codex_profile_overrides_prefers_primary_over_legacy(
     # No warnings expected because only primary filenames should be used.
     warnings = [record for record in caplog.records if record.levelno >= logging.WARNING]
     assert not warnings
+
+
+def test_apply_codex_profile_overrides_skips_unchanged_copy(
+    tmp_path, restore_settings, monkeypatch
+):
+    profile_dir = tmp_path / "profile"
+    profile_dir.mkdir()
+    source = profile_dir / "codex_agents.md"
+    source.write_text("agent directives", encoding="utf-8")
+
+    codex_home = tmp_path / "home"
+
+    monkeypatch.setattr(settings, "codex_profile_dir", str(profile_dir))
+    monkeypatch.setattr(settings, "codex_config_dir", str(codex_home))
+
+    copies: list[str] = []
+    real_copyfile = shutil.copyfile
+
+    def _counting_copyfile(src, dst, *args, **kwargs):
+        copies.append(str(src))
+        return real_copyfile(src, dst, *args, **kwargs)
+
+    monkeypatch.setattr(shutil, "copyfile", _counting_copyfile)
+
+    apply_codex_profile_overrides()
+    apply_codex_profile_overrides()
+    agents_path = codex_home / "AGENTS.md"
+    assert agents_path.read_text(encoding="utf-8") == "agent directives"
+    assert len(copies) == 1
+
+    source.write_text("updated directives", encoding="utf-8")
+    apply_codex_profile_overrides()
+    assert agents_path.read_text(encoding="utf-8") == "updated directives"
+    assert len(copies) == 2
@@ -0,0 +1,28 @@
+import pytest
+
+
+@pytest.mark.parametrize("method", ["POST", "GET", "DELETE"])
+def test_preflight_allows_any_method(main_client, method):
+    result = main_client(
+        "OPTIONS",
+        "/v1/chat/completions",
+        headers={
+            "origin": "https://app.example",
+            "access-control-request-method": method,
+            "access-control-request-headers": "authorization, content-type, x-stainless-os",
+        },
+    )
+
+    assert result.status == 200
+    assert result.headers["access-control-allow-origin"] == "*"
+    assert method in result.headers["access-control-allow-methods"]
+    assert result.headers["access-control-allow-headers"] == (
+        "authorization, content-type, x-stainless-os"
+    )
+
+
+def test_simple_request_gets_cors_header(main_client):
+    result = main_client("GET", "/v1/models", headers={"origin": "https://app.example"})
+
+    assert result.status == 200
+    assert result.headers["access-control-allow-origin"] == "*"
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from app import main, model_registry
+from app.codex import CodexError
+
+
+@pytest.fixture
+def registry_state(monkeypatch):
+    monkeypatch.setattr(model_registry, "_AVAILABLE_MODELS", [model_registry.DEFAULT_MODEL])
+    monkeypatch.setattr(model_registry, "_MODELS_BODY", None)
+    monkeypatch.setattr(model_registry, "_REFRESH_TASK", None)
+    yield
+    model_registry.choose_model.cache_clear()
+
+
+def test_lifespan_aborts_when_profile_bootstrap_fails(monkeypatch, registry_state):
+    def _bad_profile():
+        raise CodexError("profile directory is not readable")
+
+    started = []
+    monkeypatch.setattr(main, "apply_codex_profile_overrides", _bad_profile)
+    monkeypatch.setattr(
+        main, "start_model_registry_refresh", lambda: started.append(True)
+    )
+
+    async def _startup():
+        async with main.lifespan(main.app):
+            pass
+
+    with pytest.raises(CodexError):
+        asyncio.run(_startup())
+    assert started == []
+
+
+def test_requested_model_waits_for_slow_discovery(monkeypatch, registry_state):
+    async def _slow_models():
+        await asyncio.sleep(0.1)
+        return ["gpt-5"]
+
+    monkeypatch.setattr(main, "_MODEL_REGISTRY_WAIT", 0.01)
+    monkeypatch.setattr(main, "apply_codex_profile_overrides", lambda: None)
+    monkeypatch.setattr(model_registry, "list_codex_models", _slow_models)
+
+    async def _scenario():
+        async with main.lifespan(main.app):
+            # Past the short wait the fallback list is known, but a real model
+            # name is resolved once discovery finishes instead of a 404.
+            return await main._choose_model("gpt-5 high")
+
+    assert asyncio.run(_scenario()) == ("gpt-5", "high")
+
+
+def test_unknown_model_is_rejected_after_discovery(monkeypatch, registry_state):
+    async def _models():
+        return ["gpt-5"]
+
+    monkeypatch.setattr(main, "apply_codex_profile_overrides", lambda: None)
+    monkeypatch.setattr(model_registry, "list_codex_models", _models)
+
+    async def _scenario():
+        async with main.lifespan(main.app):
+            await main._choose_model("does-not-exist")
+
+    with pytest.raises(ValueError):
+        asyncio.run(_scenario())
@@ -0,0 +1,140 @@
+import pytest
+
+from app import main
+
+
+@pytest.fixture
+def main_codex_calls(monkeypatch):
+    calls = []
+
+    async def _fake_last_message(prompt, overrides=None, images=None, model=None):
+        calls.append({"prompt": prompt, "overrides": overrides, "model": model})
+        return "pong"
+
+    monkeypatch.setattr(main, "run_codex_last_message", _fake_last_message)
+    return calls
+
+
+@pytest.mark.parametrize(
+    ("path", "payload"),
+    [
+        ("/v1/chat/completions", {"model": "gpt-5", "messages": [{"role": "user", "content": "ping"}]}),
+        ("/v1/responses", {"model": "gpt-5", "input": "ping"}),
+    ],
+)
+def test_valid_body_reaches_codex(main_client, main_codex_calls, path, payload):
+    result = main_client("POST", path, json_body=payload)
+
+    assert result.status == 200
+    assert main_codex_calls[0]["model"] == "gpt-5"
+    assert "ping" in main_codex_calls[0]["prompt"]
+
+
+def test_chat_body_options_are_parsed(main_client, main_codex_calls):
+    payload = {
+        "model": "gpt-5 high",
+        "messages": [{"role": "user", "content": "ping"}],
+        "x_codex": {"sandbox": "read-only", "network_access": False},
+    }
+
+    result = main_client("POST", "/v1/chat/completions", json_body=payload)
+
+    assert result.status == 200
+    assert main_codex_calls[0]["overrides"] == {
+        "sandbox": "read-only",
+        "network_access": False,
+        "reasoning_effort": "high",
+    }
+
+
+@pytest.mark.parametrize(
+    ("path", "payload", "expected"),
+    [
+        (
+            "/v1/chat/completions",
+            {"model": "gpt-5"},
+            {"type": "missing", "loc": ["body", "messages"], "msg": "Field required"},
+        ),
+        (
+            "/v1/chat/completions",
+            {"messages": "nope"},
+            {"type": "list_type", "loc": ["body", "messages"], "msg": "Input should be a valid array"},
+        ),
+        (
+            "/v1/chat/completions",
+            {"messages": [{"content": "hi"}]},
+            {"type": "missing", "loc": ["body", "messages", 0, "role"], "msg": "Field required"},
+        ),
+        (
+            "/v1/responses",
+            {"model": "gpt-5"},
+            {"type": "missing", "loc": ["body", "input"], "msg": "Field required"},
+        ),
+        (
+            "/v1/responses",
+            {"input": "hi", "reasoning": {"effort": 3}},
+            {
+                "type": "string_type",
+                "loc": ["body", "reasoning", "effort"],
+                "msg": "Input should be a valid string",
+            },
+        ),
+    ],
+)
+def test_schema_errors_use_fastapi_422_shape(main_client, main_codex_calls, path, payload, expected):
+    result = main_client("POST", path, json_body=payload)
+
+    assert result.status == 422
+    (error,) = result.json()["detail"]
+    assert {key: error[key] for key in expected} == expected
+    assert "input" in error
+    assert main_codex_calls == []
+
+
+@pytest.mark.parametrize("path", ["/v1/chat/completions", "/v1/responses"])
+def test_malformed_json_is_rejected(main_client, main_codex_calls, path):
+    result = main_client(
+        "POST", path, body=b'{"messages": [', headers={"content-type": "application/json"}
+    )
+
+    assert result.status == 422
+    (error,) = result.json()["detail"]
+    assert error["type"] == "json_invalid"
+    assert error["loc"][0] == "body"
+    assert main_codex_calls == []
+
+
+@pytest.mark.parametrize("path", ["/v1/chat/completions", "/v1/responses"])
+def test_empty_body_is_reported_missing(main_client, main_codex_calls, path):
+    result = main_client("POST", path, body=b"", headers={"content-type": "application/json"})
+
+    assert result.status == 422
+    assert result.json()["detail"] == [
+        {"type": "missing", "loc": ["body"], "msg": "Field required", "input": None}
+    ]
+
+
+def test_non_json_content_type_is_rejected(main_client, main_codex_calls):
+    body = b'{"messages": [{"role": "user", "content": "hi"}]}'
+
+    result = main_client(
+        "POST", "/v1/chat/completions", body=body, headers={"content-type": "text/plain"}
+    )
+
+    assert result.status == 422
+    (error,) = result.json()["detail"]
+    assert error["type"] == "model_attributes_type"
+    assert error["loc"] == ["body"]
+    assert main_codex_calls == []
+
+
+@pytest.mark.parametrize(
+    "content_type", ["application/json; charset=utf-8", "application/vnd.api+json", None]
+)
+def test_json_content_type_variants_are_accepted(main_client, main_codex_calls, content_type):
+    body = b'{"messages": [{"role": "user", "content": "hi"}]}'
+    headers = {"content-type": content_type} if content_type else {}
+
+    result = main_client("POST", "/v1/chat/completions", body=body, headers=headers)
+
+    assert result.status == 200
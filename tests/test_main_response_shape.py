@@ -0,0 +1,164 @@
+"""Golden tests: the hand-serialized bodies must match the schema models."""
+
+import json
+
+import pytest
+
+from app import main
+from app.schemas import (
+    ChatChoice,
+    ChatCompletionResponse,
+    ChatMessageResponse,
+    ResponsesMessage,
+    ResponsesObject,
+    ResponsesOutputText,
+)
+
+# Quotes, a newline, non-ASCII and an astral character exercise the escaping.
+_TEXT = 'Hé said "hi"\n☃ \U0001F600'
+
+
+def _same_json(actual, expected):
+    """Compare values *and* key order, as a client reading raw JSON would."""
+    assert json.dumps(actual) == json.dumps(expected)
+
+
+def _sse_events(body: bytes):
+    events = []
+    for frame in body.decode().split("\n\n"):
+        if not frame:
+            continue
+        fields = dict(line.split(": ", 1) for line in frame.split("\n"))
+        events.append((fields.get("event"), fields["data"]))
+    return events
+
+
+def _responses_object(resp_id, msg_id, created, model, text):
+    return ResponsesObject(
+        id=resp_id,
+        created=created,
+        model=model,
+        status="completed",
+        output=[ResponsesMessage(id=msg_id, content=[ResponsesOutputText(text=text)])],
+    ).model_dump(mode="json")
+
+
+@pytest.fixture
+def main_codex_text(monkeypatch):
+    chunks = ['Hé said "hi"', "\n", "☃ \U0001F600"]
+
+    async def _fake_run_codex(prompt, overrides=None, images=None, model=None):
+        for chunk in chunks:
+            yield chunk
+
+    async def _fake_last_message(prompt, overrides=None, images=None, model=None):
+        return _TEXT
+
+    monkeypatch.setattr(main, "run_codex", _fake_run_codex)
+    monkeypatch.setattr(main, "run_codex_last_message", _fake_last_message)
+    return _TEXT
+
+
+def test_chat_completion_body_matches_schema(main_client, main_codex_text):
+    result = main_client(
+        "POST",
+        "/v1/chat/completions",
+        json_body={"messages": [{"role": "user", "content": "hi"}]},
+    )
+
+    assert result.status == 200
+    assert result.headers["content-type"] == "application/json"
+    expected = ChatCompletionResponse(
+        choices=[ChatChoice(message=ChatMessageResponse(content=main_codex_text))]
+    ).model_dump(mode="json")
+    _same_json(result.json(), expected)
+
+
+def test_responses_body_matches_schema(main_client, main_codex_text):
+    result = main_client("POST", "/v1/responses", json_body={"input": "hi"})
+
+    assert result.status == 200
+    assert result.headers["content-type"] == "application/json"
+    body = result.json()
+    expected = _responses_object(
+        body["id"], body["output"][0]["id"], body["created"], "gpt-5", main_codex_text
+    )
+    _same_json(body, expected)
+
+
+def test_chat_stream_chunks_match_previous_shape(main_client, main_codex_text):
+    result = main_client(
+        "POST",
+        "/v1/chat/completions",
+        json_body={"messages": [{"role": "user", "content": "hi"}], "stream": True},
+    )
+
+    events = _sse_events(result.body)
+    assert events[-1] == (None, "[DONE]")
+    text = ""
+    for event, data in events[:-1]:
+        assert event is None
+        chunk = json.loads(data)
+        content = chunk["choices"][0]["delta"]["content"]
+        _same_json(
+            chunk,
+            {"choices": [{"delta": {"content": content}, "index": 0, "finish_reason": None}]},
+        )
+        text += content
+    assert text == main_codex_text
+
+
+def test_responses_stream_events_match_previous_shape(main_client, main_codex_text):
+    result = main_client(
+        "POST", "/v1/responses", json_body={"input": "hi", "stream": True}
+    )
+
+    events = _sse_events(result.body)
+    assert events[-1] == (None, "[DONE]")
+    name, data = events[0]
+    created_evt = json.loads(data)
+    resp_id = created_evt["id"]
+    assert name == "response.created"
+    _same_json(
+        created_evt,
+        {
+            "id": resp_id,
+            "object": "response",
+            "created": created_evt["created"],
+            "model": "gpt-5",
+            "status": "in_progress",
+        },
+    )
+
+    text = ""
+    for name, data in events[1:-3]:
+        delta_evt = json.loads(data)
+        assert name == "response.output_text.delta"
+        _same_json(delta_evt, {"id": resp_id, "delta": delta_evt["delta"]})
+        text += delta_evt["delta"]
+    assert text == main_codex_text
+
+    name, data = events[-3]
+    assert name == "response.output_text.done"
+    _same_json(json.loads(data), {"id": resp_id, "text": main_codex_text})
+
+    name, data = events[-2]
+    completed = json.loads(data)
+    assert name == "response.completed"
+    expected = _responses_object(
+        resp_id,
+        completed["output"][0]["id"],
+        created_evt["created"],
+        "gpt-5",
+        main_codex_text,
+    )
+    _same_json(completed, expected)
+
+
+def test_responses_objects_do_not_share_usage():
+    first = main._responses_object("resp_a", "msg_a", 0, "gpt-5", "a")
+    second = main._responses_object("resp_b", "msg_b", 0, "gpt-5", "b")
+
+    first["usage"]["total_tokens"] = 7
+
+    assert second["usage"] == {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
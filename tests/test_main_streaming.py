@@ -0,0 +1,337 @@
+import asyncio
+import json
+
+import pytest
+
+from app import main
+from app.codex import CodexError
+from conftest import call_asgi
+
+
+async def _collect(aiter):
+    return [item async for item in aiter]
+
+
+async def _instant(items):
+    for item in items:
+        yield item
+
+
+def _sse_events(body: bytes):
+    """Split an SSE body into (event, data) pairs."""
+    events = []
+    for frame in body.decode().split("\n\n"):
+        if not frame:
+            continue
+        event = None
+        data = None
+        for line in frame.split("\n"):
+            if line.startswith("event: "):
+                event = line[len("event: ") :]
+            elif line.startswith("data: "):
+                data = line[len("data: ") :]
+        events.append((event, data))
+    return events
+
+
+def test_iter_batches_releases_on_size():
+    batches = asyncio.run(
+        _collect(main._iter_batches(_instant(["aaaa", "bbbb", "cccc", "dd"]), 10, 60.0))
+    )
+
+    # The third item pushes the batch to 12 >= 10; the tail flushes at the end.
+    assert batches == [["aaaa", "bbbb", "cccc"], ["dd"]]
+
+
+def test_iter_batches_releases_on_interval():
+    async def _slow():
+        for item in ("a", "b", "c"):
+            yield item
+            await asyncio.sleep(0.05)
+
+    batches = asyncio.run(_collect(main._iter_batches(_slow(), 1000, 0.005)))
+
+    assert batches == [["a"], ["b"], ["c"]]
+
+
+def test_iter_batches_prefetches_next_item_while_batch_is_consumed():
+    log = []
+
+    async def _producer():
+        for i in range(3):
+            log.append(f"produce{i}")
+            yield "x" * 10
+
+    async def _scenario():
+        batches = main._iter_batches(_producer(), 10, 60.0)
+        first = await batches.__anext__()
+        log.append("consumed")
+        await asyncio.sleep(0)
+        snapshot = list(log)
+        await batches.aclose()
+        return first, snapshot
+
+    first, snapshot = asyncio.run(_scenario())
+
+    assert first == ["x" * 10]
+    # The producer was already asked for the next item before the consumer
+    # came back for another batch.
+    assert snapshot == ["produce0", "consumed", "produce1"]
+
+
+def test_closing_batches_closes_a_suspended_producer():
+    closed = []
+
+    async def _producer():
+        try:
+            for i in range(100):
+                yield "x" * 10
+        finally:
+            closed.append(True)
+
+    async def _scenario():
+        batches = main._iter_batches(_producer(), 10, 60.0)
+        await batches.__anext__()
+        # Let the prefetch finish so the producer is parked at a `yield`,
+        # where only an explicit aclose() reaches its `finally`.
+        await asyncio.sleep(0)
+        await batches.aclose()
+        # Checked before asyncio.run finalizes leftover async generators.
+        return list(closed)
+
+    assert asyncio.run(_scenario()) == [True]
+
+
+def test_coalesce_text_caps_delta_size():
+    chunks = ["y" * 100] * 10
+
+    merged = asyncio.run(_collect(main._coalesce_text(_instant(chunks))))
+
+    assert [len(text) for text in merged] == [600, 400]
+    assert main._DELTA_MAX_CHARS == 512
+
+
+def test_coalesce_text_drops_empty_batches():
+    merged = asyncio.run(_collect(main._coalesce_text(_instant(["", ""]))))
+
+    assert merged == []
+
+
+def test_coalesce_frames_keeps_frames_intact_and_caps_writes():
+    frame = b"data: " + b"z" * 1016 + b"\n\n"  # 1 KiB per frame
+    frames = [frame] * 10
+
+    writes = asyncio.run(_collect(main._coalesce_frames(_instant(frames))))
+
+    assert main._SSE_FLUSH_BYTES == 8192
+    assert [len(w) for w in writes] == [8 * 1024, 2 * 1024]
+    assert b"".join(writes) == b"".join(frames)
+
+
+def test_coalesce_frames_writes_built_frames_before_source_error():
+    frames = [b"data: one\n\n", b"data: two\n\n"]
+
+    async def _failing_frames():
+        for frame in frames:
+            yield frame
+        raise RuntimeError("frame source failed")
+
+    async def _scenario():
+        writes = []
+        with pytest.raises(RuntimeError, match="frame source failed"):
+            async for write in main._coalesce_frames(_failing_frames()):
+                writes.append(write)
+        return writes
+
+    # Both frames are under the byte and time bounds, so without the flush on
+    # error they would still be pending when the source raised.
+    assert asyncio.run(_scenario()) == [b"".join(frames)]
+
+
+@pytest.fixture
+def main_stream_text(monkeypatch):
+    chunks = ["Hello", ", ", "world"]
+
+    async def _fake_run_codex(prompt, overrides=None, images=None, model=None):
+        for chunk in chunks:
+            yield chunk
+
+    monkeypatch.setattr(main, "run_codex", _fake_run_codex)
+    return "".join(chunks)
+
+
+def test_chat_stream_ends_with_done(main_client, main_stream_text):
+    result = main_client(
+        "POST",
+        "/v1/chat/completions",
+        json_body={"messages": [{"role": "user", "content": "hi"}], "stream": True},
+    )
+
+    assert result.status == 200
+    assert result.headers["content-type"].startswith("text/event-stream")
+    events = _sse_events(result.body)
+    assert events[-1] == (None, "[DONE]")
+    deltas = [json.loads(data) for _, data in events[:-1]]
+    assert "".join(d["choices"][0]["delta"]["content"] for d in deltas) == main_stream_text
+    assert all(d["choices"][0]["finish_reason"] is None for d in deltas)
+
+
+def test_responses_stream_event_order(main_client, main_stream_text):
+    result = main_client(
+        "POST", "/v1/responses", json_body={"input": "hi", "stream": True}
+    )
+
+    assert result.status == 200
+    events = _sse_events(result.body)
+    names = [name for name, _ in events]
+    assert names[0] == "response.created"
+    assert set(names[1:-3]) == {"response.output_text.delta"}
+    assert names[-3:] == ["response.output_text.done", "response.completed", None]
+    assert events[-1][1] == "[DONE]"
+    assert json.loads(events[-3][1])["text"] == main_stream_text
+
+
+def test_responses_stream_reports_codex_error_before_done(main_client, monkeypatch):
+    async def _failing_run_codex(prompt, overrides=None, images=None, model=None):
+        yield "partial"
+        raise CodexError("codex exploded")
+
+    monkeypatch.setattr(main, "run_codex", _failing_run_codex)
+
+    result = main_client(
+        "POST", "/v1/responses", json_body={"input": "hi", "stream": True}
+    )
+
+    events = _sse_events(result.body)
+    assert [name for name, _ in events[-2:]] == ["response.error", None]
+    assert json.loads(events[-2][1])["error"] == {"message": "codex exploded"}
+    assert events[-1][1] == "[DONE]"
+
+
+@pytest.fixture
+def main_failing_codex(monkeypatch):
+    async def _failing_run_codex(prompt, overrides=None, images=None, model=None):
+        yield "Here is half "
+        yield "of the answer"
+        raise CodexError("codex exploded")
+
+    monkeypatch.setattr(main, "run_codex", _failing_run_codex)
+    return "Here is half of the answer"
+
+
+def test_responses_stream_sends_partial_text_before_error(main_client, main_failing_codex):
+    result = main_client(
+        "POST", "/v1/responses", json_body={"input": "hi", "stream": True}
+    )
+
+    events = _sse_events(result.body)
+    names = [name for name, _ in events]
+    assert names[0] == "response.created"
+    assert set(names[1:-2]) == {"response.output_text.delta"}
+    assert names[-2:] == ["response.error", None]
+    text = "".join(json.loads(data)["delta"] for _, data in events[1:-2])
+    assert text == main_failing_codex
+
+
+def test_chat_stream_sends_partial_text_before_failing(main_client, main_failing_codex):
+    # The chat stream has no error event; the failure ends the response
+    # without [DONE], but the text produced so far must still go out.
+    result = main_client(
+        "POST",
+        "/v1/chat/completions",
+        json_body={"messages": [{"role": "user", "content": "hi"}], "stream": True},
+        raise_app_exceptions=False,
+    )
+
+    events = _sse_events(result.body)
+    assert events
+    assert (None, "[DONE]") not in events
+    text = "".join(
+        json.loads(data)["choices"][0]["delta"]["content"] for _, data in events
+    )
+    assert text == main_failing_codex
+
+
+def test_iter_batches_flushes_pending_items_before_producer_error():
+    async def _failing():
+        yield "a"
+        yield "b"
+        raise CodexError("boom")
+
+    async def _scenario():
+        seen = []
+        with pytest.raises(CodexError, match="boom"):
+            async for batch in main._iter_batches(_failing(), 1000, 60.0):
+                seen.append(batch)
+        return seen
+
+    assert asyncio.run(_scenario()) == [["a", "b"]]
+
+
+@pytest.mark.parametrize("path", ["/v1/chat/completions", "/v1/responses"])
+def test_client_disconnect_closes_codex_stream(main_client, monkeypatch, path):
+    state = {"yielded": 0, "closed": False}
+
+    async def _endless_run_codex(prompt, overrides=None, images=None, model=None):
+        try:
+            while True:
+                state["yielded"] += 1
+                yield "tick "
+                await asyncio.sleep(0.01)
+        finally:
+            state["closed"] = True
+
+    monkeypatch.setattr(main, "run_codex", _endless_run_codex)
+    payload = (
+        {"messages": [{"role": "user", "content": "hi"}], "stream": True}
+        if path == "/v1/chat/completions"
+        else {"input": "hi", "stream": True}
+    )
+
+    async def _scenario():
+        result = await call_asgi(
+            main.app, "POST", path, json_body=payload, disconnect_after_chunks=1
+        )
+        # Snapshot before asyncio.run finalizes any leftover async generators.
+        return result, dict(state)
+
+    result, seen = asyncio.run(_scenario())
+
+    assert result.status == 200
+    assert seen["closed"] is True, seen
+    assert seen["yielded"] < 100
+
+
+def test_streams_are_not_gzipped(main_client, monkeypatch):
+    async def _long_run_codex(prompt, overrides=None, images=None, model=None):
+        for _ in range(50):
+            yield "x" * 100
+
+    monkeypatch.setattr(main, "run_codex", _long_run_codex)
+
+    result = main_client(
+        "POST",
+        "/v1/responses",
+        json_body={"input": "hi", "stream": True},
+        headers={"accept-encoding": "gzip"},
+    )
+
+    assert len(result.body) > 1024
+    assert "content-encoding" not in result.headers
+    assert _sse_events(result.body)[-1] == (None, "[DONE]")
+
+
+def test_large_non_stream_bodies_are_gzipped(main_client, monkeypatch):
+    async def _long_last_message(prompt, overrides=None, images=None, model=None):
+        return "x" * 5000
+
+    monkeypatch.setattr(main, "run_codex_last_message", _long_last_message)
+
+    result = main_client(
+        "POST",
+        "/v1/responses",
+        json_body={"input": "hi"},
+        headers={"accept-encoding": "gzip"},
+    )
+
+    assert result.headers["content-encoding"] == "gzip"
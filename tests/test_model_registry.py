@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+import pytest
+
+from app import model_registry
+
+
+def test_choose_model_cache_follows_registry_refresh(monkeypatch):
+    async def _models(names):
+        return list(names)
+
+    monkeypatch.setattr(model_registry, "_AVAILABLE_MODELS", model_registry._AVAILABLE_MODELS)
+    monkeypatch.setattr(model_registry, "apply_codex_profile_overrides", lambda: None)
+    monkeypatch.setattr(model_registry, "list_codex_models", lambda: _models(["gpt-5-codex"]))
+    asyncio.run(model_registry.initialize_model_registry())
+
+    assert model_registry.choose_model("gpt-5 high") == ("gpt-5", "high")
+    assert model_registry.choose_model(None) == ("gpt-5-codex", None)
+
+    monkeypatch.setattr(model_registry, "list_codex_models", lambda: _models(["o3"]))
+    asyncio.run(model_registry.initialize_model_registry())
+
+    with pytest.raises(ValueError):
+        model_registry.choose_model("gpt-5 high")
+    assert model_registry.choose_model(None) == ("o3", None)
+    model_registry.choose_model.cache_clear()
+
+
+def test_models_body_is_rebuilt_after_registry_refresh(monkeypatch):
+    async def _models(names):
+        return list(names)
+
+    monkeypatch.setattr(model_registry, "_AVAILABLE_MODELS", model_registry._AVAILABLE_MODELS)
+    monkeypatch.setattr(model_registry, "_MODELS_BODY", None)
+    monkeypatch.setattr(model_registry, "apply_codex_profile_overrides", lambda: None)
+    monkeypatch.setattr(model_registry, "list_codex_models", lambda: _models(["o3"]))
+    asyncio.run(model_registry.initialize_model_registry())
+
+    body = model_registry.get_models_body()
+    assert json.loads(body)["data"][0] == {"id": "o3"}
+    assert model_registry.get_models_body() is body
+
+    monkeypatch.setattr(model_registry, "list_codex_models", lambda: _models(["gpt-5"]))
+    asyncio.run(model_registry.initialize_model_registry())
+
+    assert json.loads(model_registry.get_models_body())["data"][0] == {"id": "gpt-5"}
+    model_registry.choose_model.cache_clear()
+
+
+def test_background_refresh_serves_default_until_discovery_finishes(monkeypatch):
+    release = None
+
+    async def _slow_models():
+        await release.wait()
+        return ["gpt-5"]
+
+    monkeypatch.setattr(model_registry, "_AVAILABLE_MODELS", [model_registry.DEFAULT_MODEL])
+    monkeypatch.setattr(model_registry, "_REFRESH_TASK", None)
+    monkeypatch.setattr(model_registry, "apply_codex_profile_overrides", lambda: None)
+    monkeypatch.setattr(model_registry, "list_codex_models", _slow_models)
+
+    async def _scenario():
+        nonlocal release
+        release = asyncio.Event()
+        task = model_registry.start_model_registry_refresh()
+        assert model_registry.start_model_registry_refresh() is task
+        await model_registry.wait_for_model_registry(timeout=0.01)
+        assert model_registry.get_available_models() == [model_registry.DEFAULT_MODEL]
+
+        release.set()
+        await model_registry.wait_for_model_registry()
+        return model_registry.get_available_models()
+
+    assert asyncio.run(_scenario()) == ["gpt-5"]
+    model_registry.choose_model.cache_clear()
+
+
+def test_background_refresh_logs_unexpected_failures(monkeypatch, caplog):
+    async def _broken():
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(model_registry, "_REFRESH_TASK", None)
+    monkeypatch.setattr(model_registry, "refresh_model_registry", _broken)
+
+    async def _scenario():
+        task = model_registry.start_model_registry_refresh()
+        await asyncio.wait((task,))
+        await asyncio.sleep(0)
+
+    with caplog.at_level("ERROR", logger=model_registry.logger.name):
+        asyncio.run(_scenario())
+
+    assert "Background Codex model discovery failed" in caplog.text
+    assert "boom" in caplog.text